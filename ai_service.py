@@ -1,10 +1,170 @@
-import google.generativeai as genai
-import time
+import hashlib
 import json
-from PIL import Image
+import os
+import random
+import time
+
+from gemini_client import configure as configure_gemini, get_model, flights
+from image_tools import prepare_image, dhash, hamming, extract_frames, contact_sheet, SHEET_COLUMNS
+from json_stream import ArrayItemParser
+from metrics import metrics
+from quota_scheduler import QuotaScheduler, QuotaBusy
+import vision_cache
+import profile_cache
+
+REPLAY_CHUNK_SIZE = 80
+
+# Retry policy for streamed generations: exponential backoff with jitter, bounded
+# by a total deadline rather than a fixed number of attempts.
+AI_CALLS_PER_MINUTE = int(os.environ.get("AI_CALLS_PER_MINUTE", 10))
+AI_DEADLINE = float(os.environ.get("AI_RETRY_DEADLINE", 30))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 8.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# HTTP status of google.api_core errors that lack a numeric `code`, by class name
+# so the SDK does not have to be imported to classify its errors.
+ERROR_STATUSES = {"ResourceExhausted": 429, "TooManyRequests": 429, "InternalServerError": 500,
+                  "BadGateway": 502, "ServiceUnavailable": 503, "GatewayTimeout": 504, "DeadlineExceeded": 504}
+# Transport failures (builtin and requests' classes share these names).
+TRANSIENT_ERRORS = {"TimeoutError", "Timeout", "ConnectionError"}
+
+# Every Gemini call in the process goes through one scheduler. Interactive
+# profiles go first, batch jobs only get what is left; inside a class sessions
+# take turns. A request that would wait longer than its class allows, or whose
+# session already has MAX_PENDING_PER_SESSION queued, is refused with QuotaBusy
+# (carrying the estimated wait) instead of piling up.
+PRIORITY_PROFILE, PRIORITY_RECOMMEND, PRIORITY_VISION, PRIORITY_BATCH = range(4)
+MAX_QUEUE_WAIT = {PRIORITY_PROFILE: 60, PRIORITY_RECOMMEND: 60, PRIORITY_VISION: 45, PRIORITY_BATCH: None}
+MAX_PENDING_PER_SESSION = 3
+AI_BURST = 2
+QUEUE_NOTICE_INTERVAL = 1.0
+scheduler = QuotaScheduler(AI_CALLS_PER_MINUTE, burst=AI_BURST)
+
+# Stream items. Consumers that only look at `.text` keep working: RetryChunk has
+# no text, ErrorChunk carries a user-facing message.
+class TextChunk:
+    def __init__(self, text): self.text = text
+
+class RetryChunk:
+    def __init__(self, attempt, delay, reason):
+        self.attempt = attempt
+        self.delay = delay
+        self.reason = reason
+
+class ErrorChunk:
+    def __init__(self, text, code=None):
+        self.text = text
+        self.code = code
+
+class QueueChunk:
+    def __init__(self, position, wait):
+        self.position = position
+        self.wait = wait
+
+def estimate_ai_wait(session, priority):
+    return scheduler.estimate_wait(session, priority)
+
+def _admit(session, priority):
+    max_pending = None if priority == PRIORITY_BATCH else MAX_PENDING_PER_SESSION
+    return scheduler.submit(session, priority, max_wait=MAX_QUEUE_WAIT[priority], max_pending=max_pending)
+
+def _acquire(session, priority):
+    # Blocks until this session's turn; used by the non-streaming calls.
+    ticket = _admit(session, priority)
+    max_wait = MAX_QUEUE_WAIT[priority]
+    try:
+        granted = ticket.wait(None if max_wait is None else 2 * max_wait)
+    except BaseException:
+        ticket.cancel()
+        raise
+    if not granted:
+        ticket.cancel()
+        raise QuotaBusy(ticket.estimate()[1])
+
+def _wait_turn(ticket):
+    # Yields QueueChunks while the ticket waits. Closing the generator drops the
+    # ticket; SingleFlight does that once the last follower of a stream has gone.
+    timeout = 0
+    try:
+        while not ticket.wait(timeout):
+            yield QueueChunk(*ticket.estimate())
+            timeout = QUEUE_NOTICE_INTERVAL
+    except BaseException:
+        ticket.cancel()
+        raise
+
+def _note_rate_limited(error, delay):
+    if _error_status(error) == 429:
+        scheduler.pause(delay)
+
+# Recommendations are requested as schema-constrained JSON and streamed, so each
+# item can be shown as soon as its object closes.
+RECOMMENDATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "genre": {"type": "string"},
+            "reason": {"type": "string"},
+        },
+        "required": ["title", "genre", "reason"],
+    },
+}
+RECOMMENDATION_CONFIG = {"response_mime_type": "application/json", "response_schema": RECOMMENDATION_SCHEMA}
+
+# Batched profiles: several characters per Gemini call, one object per character.
+PROFILE_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "mal_id": {"type": "integer"},
+            "profile": {"type": "string"},
+        },
+        "required": ["mal_id", "profile"],
+    },
+}
+PROFILE_BATCH_CONFIG = {"response_mime_type": "application/json", "response_schema": PROFILE_BATCH_SCHEMA}
+PROFILE_BATCH_SIZE = 5
+PROFILE_BATCH_ATTEMPTS = 3
+BATCH_BIO_CHARS = 1200
+
+# Batched vision: frames go out as numbered panels on contact sheets, and the
+# answer lists the characters seen in each panel.
+VISION_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "panel": {"type": "integer"},
+            "characters": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "confidence": {"type": "number"},
+                    },
+                    "required": ["name", "confidence"],
+                },
+            },
+        },
+        "required": ["panel", "characters"],
+    },
+}
+VISION_BATCH_CONFIG = {"response_mime_type": "application/json", "response_schema": VISION_BATCH_SCHEMA}
+PANELS_PER_SHEET = SHEET_COLUMNS * SHEET_COLUMNS
+SHEETS_PER_REQUEST = 4
+
+def request_ai_recommendations(age, interests, mood, style, content_type, session=None, priority=PRIORITY_RECOMMEND):
+    # The whole list at once; raises on failure (used by batch jobs that report errors).
+    return list(stream_ai_recommendations(age, interests, mood, style, content_type, session=session, priority=priority))
 
-def get_ai_recommendations(age, interests, mood, style, content_type):
-    model = genai.GenerativeModel('gemini-2.0-flash')
+def stream_ai_recommendations(age, interests, mood, style, content_type, session=None, priority=PRIORITY_RECOMMEND):
+    # Yields recommendation dicts as they complete; raises if the stream fails
+    # (QuotaBusy when the shared quota queue is too long).
+    model = get_model(generation_config=RECOMMENDATION_CONFIG)
     
     prompt = f"""
     Act as an expert OTAKU. Recommend 5 {content_type} series.
@@ -13,41 +173,315 @@ def get_ai_recommendations(age, interests, mood, style, content_type):
     Current Mood: {mood}
     Preferred Style: {style}
     
-    Requirement: Return ONLY a valid JSON list (no markdown, no extra text) with this format:
-    [
-        {{"title": "Name", "genre": "Genre1, Genre2", "reason": "Short explanation why it fits"}}
-    ]
+    For each series give its title, its main genres ("Genre1, Genre2") and a short explanation why it fits.
     """
     
+    # Identical profiles submitted concurrently share one Gemini stream.
+    key = "recommend:" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    for item in flights.stream(key, lambda: _recommendation_items(model, prompt, session, priority)):
+        yield item
+
+def _recommendation_items(model, prompt, session, priority):
+    _acquire(session, priority)
+    started = time.monotonic()
+    last_chunk = None
+    try:
+        response = model.generate_content(prompt, stream=True)
+        parser = ArrayItemParser()
+        for chunk in response:
+            last_chunk = chunk
+            for item in parser.feed(chunk.text):
+                if isinstance(item, dict) and item.get('title'):
+                    yield item
+    except Exception as e:
+        metrics.record_call("gemini", "recommend", time.monotonic() - started, status=_error_status(e))
+        _note_rate_limited(e, backoff_delay(1))
+        raise
+    metrics.record_call("gemini", "recommend", time.monotonic() - started)
+    _record_usage(last_chunk)
+
+def ai_vision_detect(image_file, session=None):
+    # Raises QuotaBusy when the shared quota queue is too long; any other failure is "Unknown".
     try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith("```"):
-            lines = text.split("\n")
-            text = "\n".join(lines[1:-1])
-        
-        return json.loads(text)
+        img = prepare_image(image_file)
     except Exception as e:
-        return []
+        return "Unknown"
+
+    phash = dhash(img)
+    cached = vision_cache.lookup(phash)
+    if cached is not None:
+        return cached
 
-def ai_vision_detect(image_file):
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    model = get_model()
     
     try:
-        img = Image.open(image_file)
         prompt = "Look at this anime character. Return ONLY the full name of the character. If not sure, return 'Unknown'."
-        response = model.generate_content([prompt, img])
-        return response.text.strip()
+        response = flights.call(f"vision:{phash:016x}", lambda: _scheduled_call(session, PRIORITY_VISION, "vision",
+                                                                           lambda: model.generate_content([prompt, img])))
+        name = response.text.strip()
+    except QuotaBusy:
+        raise
     except Exception as e:
         return "Unknown"
 
-def generate_ai_stream(info):
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    
-    name = info.get('name', 'N/A')
+    if name and name != "Unknown":
+        vision_cache.store(phash, name)
+    return name
+
+def ai_vision_batch(uploads, session=None):
+    # One ranked character list per upload (image, animated GIF/WebP or video
+    # clip). Frames are extracted locally; near-identical frames across all
+    # uploads are sent once, cached ones not at all, and the rest go out as
+    # contact sheets, up to SHEETS_PER_REQUEST sheets per Gemini call.
+    # Raises QuotaBusy like ai_vision_detect.
+    inputs = []   # (name, [index into frames], error)
+    frames = []   # unique frames: {'hash', 'image', 'characters', 'error'}
+    for number, upload in enumerate(uploads, 1):
+        name = getattr(upload, "name", None) or f"Upload {number}"
+        try:
+            images = extract_frames(upload)
+        except RuntimeError as e:  # e.g. a video clip without OpenCV installed
+            inputs.append((name, [], str(e)))
+            continue
+        except Exception:
+            inputs.append((name, [], "not a readable image or clip"))
+            continue
+        refs = []
+        for img in images:
+            phash = dhash(img)
+            match = next((i for i, f in enumerate(frames)
+                          if hamming(phash, f['hash']) <= vision_cache.MAX_DISTANCE), None)
+            if match is None:
+                frames.append({'hash': phash, 'image': img, 'characters': [], 'error': None})
+                match = len(frames) - 1
+            if match not in refs:
+                refs.append(match)
+        inputs.append((name, refs, None))
+
+    todo = []
+    for frame in frames:
+        cached = vision_cache.lookup(frame['hash'])
+        if cached is not None:
+            frame['characters'] = [(cached, 1.0)]
+        else:
+            todo.append(frame)
+    per_request = PANELS_PER_SHEET * SHEETS_PER_REQUEST
+    for start in range(0, len(todo), per_request):
+        _identify_panels(todo[start:start + per_request], session)
+
+    return [_rank_input(name, [frames[i] for i in refs], error) for name, refs, error in inputs]
+
+def _identify_panels(group, session):
+    sheets = [contact_sheet([f['image'] for f in group[i:i + PANELS_PER_SHEET]], first_label=i + 1)
+              for i in range(0, len(group), PANELS_PER_SHEET)]
+    prompt = f"""
+    Each image is a grid of anime screenshots with a panel number in the top-left corner.
+    There are {len(group)} panels in total, numbered 1 to {len(group)}.
+    For every panel, list the full names of the anime characters visible in it, most prominent first,
+    each with a confidence between 0 and 1. Use an empty list when you cannot identify anyone.
+    """
+    model = get_model(generation_config=VISION_BATCH_CONFIG)
+    key = "vision_batch:" + hashlib.sha256(",".join(f"{f['hash']:016x}" for f in group).encode()).hexdigest()
+    try:
+        response = flights.call(key, lambda: _scheduled_call(session, PRIORITY_VISION, "vision_batch",
+                                                             lambda: model.generate_content([prompt, *sheets])))
+        panels = json.loads(response.text)
+    except QuotaBusy:
+        raise
+    except Exception as e:
+        for frame in group:
+            frame['error'] = str(e)
+        return
+
+    by_panel = {}
+    for item in panels if isinstance(panels, list) else []:
+        try:
+            panel = int(item['panel'])
+            found = [(c['name'].strip(), min(max(float(c.get('confidence', 0.5)), 0.0), 1.0))
+                     for c in item.get('characters') or [] if isinstance(c, dict) and c.get('name')]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        by_panel[panel] = [(n, c) for n, c in found if n and n.lower() != "unknown"]
+    for panel, frame in enumerate(group, 1):
+        frame['characters'] = by_panel.get(panel, [])
+        if frame['characters']:
+            vision_cache.store(frame['hash'], max(frame['characters'], key=lambda nc: nc[1])[0])
+
+def _rank_input(name, frames, error):
+    # Scores are the mean confidence over the input's unique frames, so a
+    # character seen clearly throughout a clip outranks a one-frame cameo.
+    scores, seen, labels = {}, {}, {}
+    for frame in frames:
+        best = {}
+        for character, confidence in frame['characters']:
+            key = character.casefold()
+            labels.setdefault(key, character)
+            best[key] = max(best.get(key, 0.0), confidence)
+        for key, confidence in best.items():
+            scores[key] = scores.get(key, 0.0) + confidence
+            seen[key] = seen.get(key, 0) + 1
+    ranked = sorted(scores, key=lambda k: (-scores[k], labels[k]))
+    if error is None and frames and not scores and all(f['error'] for f in frames):
+        error = frames[0]['error']
+    return {
+        'input': name,
+        'frames': len(frames),
+        'characters': [{'name': labels[k], 'score': round(scores[k] / len(frames), 2), 'frames': seen[k]}
+                       for k in ranked],
+        'error': error,
+    }
+
+def _error_status(error):
+    # HTTP status behind a Gemini error, or None for transport and other failures.
+    code = getattr(error, 'code', None)  # google.api_core errors carry it as an HTTPStatus
+    if isinstance(code, int) and 100 <= code < 600:
+        return int(code)
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status
+    return next((ERROR_STATUSES[c.__name__] for c in type(error).__mro__ if c.__name__ in ERROR_STATUSES), None)
+
+def _error_message(error):
+    status = _error_status(error)
+    if status == 429:
+        return "Server Busy (429). Please try again later."
+    if status is not None:
+        return f"Gemini is unavailable ({status}). Please try again later."
+    return f"Could not reach Gemini ({type(error).__name__}). Please try again later."
+
+def _record_usage(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage:
+        metrics.record_tokens(getattr(usage, 'prompt_token_count', 0), getattr(usage, 'candidates_token_count', 0))
+
+def _scheduled_call(session, priority, endpoint, fn):
+    _acquire(session, priority)
+    return _timed_call(endpoint, fn)
+
+def _timed_call(endpoint, fn):
+    started = time.monotonic()
+    try:
+        response = fn()
+    except Exception as e:
+        metrics.record_call("gemini", endpoint, time.monotonic() - started, status=_error_status(e))
+        _note_rate_limited(e, backoff_delay(1))
+        raise
+    metrics.record_call("gemini", endpoint, time.monotonic() - started)
+    _record_usage(response)
+    return response
+
+def get_api_stats():
+    summary = metrics.service_summary("gemini")
+    summary['limit'] = f"{summary['calls_last_minute']}/{scheduler.calls_per_minute} calls/min"
+    summary['calls_per_minute'] = scheduler.calls_per_minute
+    summary['queued'] = scheduler.pending()
+    summary['profile_cache_hit_ratio'] = metrics.cache_hit_ratio("profile")
+    summary['vision_cache_hit_ratio'] = metrics.cache_hit_ratio("vision")
+    return summary
+
+def _replay(text):
+    for i in range(0, len(text), REPLAY_CHUNK_SIZE):
+        yield TextChunk(text[i:i + REPLAY_CHUNK_SIZE])
+
+def _record(info, response):
+    parts = []
+    failed = False
+    for chunk in response:
+        if isinstance(chunk, ErrorChunk):
+            failed = True
+        elif isinstance(chunk, TextChunk):
+            parts.append(chunk.text)
+        yield chunk
+    full_text = "".join(parts)
+    if full_text.strip() and not failed:
+        profile_cache.put(info, full_text)
+
+def is_retryable_error(error):
+    if any(c.__name__ in TRANSIENT_ERRORS for c in type(error).__mro__):
+        return True
+    return _error_status(error) in RETRYABLE_STATUSES
+
+def backoff_delay(attempt):
+    # "Equal jitter": half the exponential step is fixed, half is random.
+    step = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempt - 1)))
+    return step / 2 + random.uniform(0, step / 2)
+
+def _resilient_stream(model, prompt, deadline, session=None):
+    started = time.monotonic()
+    emitted = ""
+    attempt = 0
+    while True:
+        # Every attempt, retries included, takes its turn in the shared queue;
+        # time spent queued doesn't count against the retry deadline.
+        try:
+            ticket = _admit(session, PRIORITY_PROFILE)
+        except QuotaBusy as e:
+            yield ErrorChunk(f"Gemini is busy for everyone right now (about {e.wait:.0f}s of queued requests). "
+                             "Please try again shortly.", code=429)
+            return
+        queued_at = time.monotonic()
+        yield from _wait_turn(ticket)
+        started += time.monotonic() - queued_at
+        remaining = deadline - (time.monotonic() - started)
+        request = prompt
+        if emitted:
+            # Resume after a mid-stream failure instead of repeating what the user already sees.
+            request = f"""{prompt}
+
+    You already wrote the beginning below. Continue exactly where it stops, without repeating any of it:
+    {emitted}"""
+        attempt_started = time.monotonic()
+        try:
+            response = model.generate_content(request, stream=True, request_options={"timeout": max(remaining, 1)})
+            last_chunk = None
+            for chunk in response:
+                last_chunk = chunk
+                text = chunk.text
+                if text:
+                    emitted += text
+                    yield TextChunk(text)
+            metrics.record_call("gemini", "profile", time.monotonic() - attempt_started)
+            # Streamed responses report cumulative usage on the final chunk.
+            _record_usage(last_chunk)
+            return
+        except Exception as e:
+            metrics.record_call("gemini", "profile", time.monotonic() - attempt_started, status=_error_status(e))
+            if not is_retryable_error(e):
+                yield ErrorChunk(f"Error: {e}")
+                return
+            attempt += 1
+            delay = backoff_delay(attempt)
+            _note_rate_limited(e, delay)
+            remaining = deadline - (time.monotonic() - started)
+            if delay >= remaining:
+                yield ErrorChunk(_error_message(e), code=_error_status(e))
+                return
+            yield RetryChunk(attempt, delay, str(e))
+            time.sleep(delay)
+
+def is_profile_cached(info):
+    return profile_cache.contains(info)
+
+def get_analysis_cache_size():
+    return profile_cache.size()
+
+def clear_analysis_cache():
+    profile_cache.clear()
+
+def _bio(info, limit):
     about = info.get('about', 'N/A')
+    if about and len(about) > limit: about = about[:limit] + "..."
+    return about
+
+def generate_ai_stream(info, deadline=AI_DEADLINE, session=None):
+    cached = profile_cache.get(info)
+    if cached is not None:
+        return _replay(cached)
+
+    model = get_model()
     
-    if about and len(about) > 2000: about = about[:2000] + "..."
+    name = info.get('name', 'N/A')
+    about = _bio(info, 2000)
 
     prompt = f"""
     You are an expert Anime Otaku. Write an engaging profile for this character in ENGLISH.
@@ -61,26 +495,109 @@ def generate_ai_stream(info):
     4. Keep it under 200 words.
     """
     
-    max_retries = 5
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt, stream=True)
-            return response
-            
-        except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "ResourceExhausted" in error_msg:
-                if attempt < max_retries - 1:
-                    time.sleep(5)
-                    continue
-                else:
-                    class ErrorChunk:
-                        def __init__(self, text): self.text = text
-                    return [ErrorChunk(f"Server Busy (429). Please try again later.")]
-            else:
-                class ErrorChunk:
-                    def __init__(self, text): self.text = text
-                return [ErrorChunk(f"Error: {error_msg}")]
+    # Everyone asking for the same character at once follows a single generation;
+    # it is recorded into the profile cache once, by the producer.
+    key = "profile:" + profile_cache.profile_key(info)
+    return flights.stream(key, lambda: _record(info, _resilient_stream(model, prompt, deadline, session)))
+
+def profile_batches(count, batch_size=PROFILE_BATCH_SIZE):
+    # Gemini calls needed for `count` uncached profiles.
+    return -(-count // batch_size)
+
+def generate_profiles(infos, session=None, priority=PRIORITY_PROFILE, batch_size=PROFILE_BATCH_SIZE):
+    # Yields (info, profile text) per character as each one completes: cached
+    # ones first, then the rest at up to `batch_size` characters per Gemini call.
+    # Each profile is cached on its own, under the same key a single-character
+    # generation uses. Raises once done if some profiles could not be generated.
+    pending = []
+    seen = set()
+    for info in infos:
+        key = profile_cache.profile_key(info)
+        if key in seen:
+            continue
+        seen.add(key)
+        cached = profile_cache.get(info)
+        if cached is not None:
+            yield info, cached
+        else:
+            pending.append(info)
+    if not pending:
+        return
+
+    model = get_model(generation_config=PROFILE_BATCH_CONFIG)
+    # All batches start at once (each waits for its own quota slot) and are read in order.
+    batches = []
+    for start in range(0, len(pending), batch_size):
+        chars = {int(info['mal_id']): info for info in pending[start:start + batch_size]}
+        batches.append((chars, _profile_batch(model, chars, session, priority)))
+    failed = []
+    error = None
+    for chars, stream in batches:
+        for attempt in range(1, PROFILE_BATCH_ATTEMPTS + 1):
+            # Retries only ask for the characters the previous answer left out.
+            try:
+                for mal_id, text in stream:
+                    info = chars.pop(mal_id, None)
+                    if info is not None:
+                        yield info, text
+            except QuotaBusy:
+                raise
+            except Exception as e:
+                error = e
+                if not is_retryable_error(e):
+                    break
+            if not chars or attempt == PROFILE_BATCH_ATTEMPTS:
+                break
+            time.sleep(backoff_delay(attempt))
+            stream = _profile_batch(model, chars, session, priority)
+        failed.extend(chars.values())
+    if failed:
+        names = ", ".join(info.get('name', str(info.get('mal_id'))) for info in failed)
+        raise RuntimeError(f"no profile for {names}" + (f" ({error})" if error else ""))
+
+def _profile_batch(model, chars, session, priority):
+    chars = dict(chars)  # the caller keeps removing what arrives; the producer needs the full set
+    entries = "\n".join(f"- mal_id: {mal_id}\n  Character Name: {info.get('name', 'N/A')}\n"
+                        f"  Bio Data: {_bio(info, BATCH_BIO_CHARS)}" for mal_id, info in chars.items())
+    prompt = f"""
+    You are an expert Anime Otaku. Write an engaging profile in ENGLISH for EACH character below.
+    {entries}
 
-    return []
+    Requirements for every profile:
+    1. Catchy Title.
+    2. Fun and enthusiastic tone (use emojis 🌟🔥).
+    3. Analyze personality & powers.
+    4. Keep it under 200 words.
+
+    Return one object per character, in the order given, with its mal_id and the profile as Markdown.
+    """
+    key = "profiles:" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return flights.stream(key, lambda: _profile_batch_items(model, prompt, chars, session, priority))
 
+def _profile_batch_items(model, prompt, chars, session, priority):
+    # One quota slot for the whole batch; every profile is cached as soon as its object closes.
+    _acquire(session, priority)
+    started = time.monotonic()
+    last_chunk = None
+    try:
+        response = model.generate_content(prompt, stream=True)
+        parser = ArrayItemParser()
+        for chunk in response:
+            last_chunk = chunk
+            for item in parser.feed(chunk.text):
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    mal_id = int(item.get('mal_id'))
+                except (TypeError, ValueError):
+                    continue
+                text = item.get('profile')
+                if mal_id in chars and isinstance(text, str) and text.strip():
+                    profile_cache.put(chars[mal_id], text)
+                    yield mal_id, text
+    except Exception as e:
+        metrics.record_call("gemini", "profile_batch", time.monotonic() - started, status=_error_status(e))
+        _note_rate_limited(e, backoff_delay(1))
+        raise
+    metrics.record_call("gemini", "profile_batch", time.monotonic() - started)
+    _record_usage(last_chunk)
@@ -0,0 +1,119 @@
+import functools
+import hashlib
+import os
+
+# # Background asset pipeline
+# Each background in resources/ is downscaled and recompressed once into WebP and
+# JPEG variants under static/bg/, which Streamlit serves as cacheable static files
+# (server.enableStaticServing). Filenames carry a fingerprint of the source, so a
+# changed source gets a new URL and old URLs can be cached forever.
+# PIL is only imported when a variant actually has to be built.
+
+RESOURCES_DIR = os.path.join(os.getcwd(), "resources")
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+BG_SUBDIR = "bg"
+
+BG_WIDTHS = (1280, 1920, 2560)
+WEBP_QUALITY = 72
+JPEG_QUALITY = 78
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return hashlib.sha1(f"{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:10]
+
+
+def _save_atomic(img, path, fmt, **options):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    img.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+
+def _build_variant(img, width, out_base):
+    from PIL import Image
+    if img.width > width:
+        height = round(img.height * width / img.width)
+        img = img.resize((width, height), Image.LANCZOS)
+    webp_path, jpg_path = f"{out_base}.webp", f"{out_base}.jpg"
+    if not os.path.exists(webp_path):
+        _save_atomic(img, webp_path, "WEBP", quality=WEBP_QUALITY, method=6)
+    if not os.path.exists(jpg_path):
+        _save_atomic(img, jpg_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+
+def _built_widths(out_dir, stem, fingerprint):
+    # Widths of a complete, already built variant set, read from the file names;
+    # None if anything is missing and the source has to be opened.
+    prefix, suffix = f"{stem}-", f"-{fingerprint}.webp"
+    widths = set()
+    for name in os.listdir(out_dir):
+        width = name[len(prefix):-len(suffix)]
+        if name.startswith(prefix) and name.endswith(suffix) and width.isdigit():
+            widths.add(int(width))
+    if not widths:
+        return None
+    # A smaller source caps every width at its own; the largest built width is that cap.
+    expected = {min(w, max(widths)) for w in BG_WIDTHS}
+    if widths != expected:
+        return None
+    if not all(os.path.exists(os.path.join(out_dir, f"{prefix}{w}-{fingerprint}.jpg")) for w in widths):
+        return None
+    return sorted(widths)
+
+
+@functools.lru_cache(maxsize=None)
+def background_variants(filename):
+    # Returns [(width, webp_url, jpg_url), ...] smallest first, or None if the source is missing.
+    src_path = os.path.join(RESOURCES_DIR, filename)
+    if not os.path.isfile(src_path):
+        return None
+
+    stem = os.path.splitext(filename)[0]
+    fingerprint = _fingerprint(src_path)
+    out_dir = os.path.join(STATIC_DIR, BG_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    widths = _built_widths(out_dir, stem, fingerprint)
+    if widths is None:
+        from PIL import Image
+        with Image.open(src_path) as src:
+            src_width = src.width  # header only, no decode
+        widths = sorted({min(w, src_width) for w in BG_WIDTHS})
+
+    variants = []
+    img = None
+    for width in widths:
+        name = f"{stem}-{width}-{fingerprint}"
+        out_base = os.path.join(out_dir, name)
+        if not (os.path.exists(f"{out_base}.webp") and os.path.exists(f"{out_base}.jpg")):
+            if img is None:
+                # Normalize orientation and drop EXIF/ICC blobs; backgrounds only need pixels.
+                from PIL import Image, ImageOps
+                with Image.open(src_path) as src:
+                    img = ImageOps.exif_transpose(src).convert("RGB")
+            _build_variant(img, width, out_base)
+        url_base = f"{STATIC_URL}/{BG_SUBDIR}/{name}"
+        variants.append((width, f"{url_base}.webp", f"{url_base}.jpg"))
+    return variants
+
+
+def _image_set(webp_url, jpg_url):
+    return f'background-image:image-set(url("{webp_url}") type("image/webp"),url("{jpg_url}") type("image/jpeg"))'
+
+
+@functools.lru_cache(maxsize=None)
+def background_rules(filename):
+    # Compact CSS for `.stApp`: one rule per breakpoint, a few hundred bytes in total.
+    variants = background_variants(filename)
+    if not variants:
+        return None
+
+    # Largest variant is the unconditional default; smaller breakpoints follow in
+    # descending order so the narrowest matching media query wins.
+    largest = variants[-1]
+    # Plain url() first for browsers without image-set() type() support.
+    rules = [f'.stApp{{background-image:url("{largest[2]}");{_image_set(largest[1], largest[2])}}}']
+    for width, webp_url, jpg_url in reversed(variants[:-1]):
+        rules.append(f"@media (max-width:{width}px){{.stApp{{{_image_set(webp_url, jpg_url)}}}}}")
+    return "".join(rules)
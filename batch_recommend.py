@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from ai_service import (configure_gemini, request_ai_recommendations, is_retryable_error, backoff_delay,
+                        scheduler, PRIORITY_BATCH)
+
+# # Batch recommendations
+# Headless entry point for precomputing recommendations for stored user profiles:
+#
+#     python batch_recommend.py profiles.jsonl -o recommendations.jsonl --concurrency 4 --rpm 10
+#
+# Input lines look like {"id": "u1", "age": 20, "interests": "...", "mood": "Happy",
+# "style": "Action Packed", "content_type": "Anime"}. The output file doubles as
+# the checkpoint: rerunning skips ids already written and reuses their results
+# for identical normalized profiles. Calls are paced by the shared Gemini
+# scheduler at batch priority, set to the --rpm quota.
+
+PROFILE_FIELDS = ('age', 'interests', 'mood', 'style', 'content_type')
+MAX_ATTEMPTS = 4
+
+
+def normalize_profile(profile):
+    normalized = {}
+    for field in PROFILE_FIELDS:
+        value = profile.get(field)
+        if field == 'age':
+            normalized[field] = int(value) if value not in (None, "") else None
+        else:
+            normalized[field] = " ".join(str(value or "").split()).casefold()
+    return normalized
+
+
+def profile_key(profile):
+    return hashlib.sha256(json.dumps(normalize_profile(profile), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"warning: skipping malformed line {line_no} in {path}", file=sys.stderr)
+
+
+class BatchRunner:
+    def __init__(self, output_path, concurrency, rpm):
+        self.output_path = output_path
+        self.concurrency = concurrency
+        scheduler.configure(rpm)
+        self.lock = threading.Lock()
+        self.done_ids = set()
+        self.results = {}      # profile key -> Future of recommendations
+        self.stats = {'total': 0, 'resumed': 0, 'generated': 0, 'cached': 0, 'failed': 0, 'gemini_calls': 0}
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.output_path):
+            return
+        for record in read_jsonl(self.output_path):
+            self.done_ids.add(str(record.get('id')))
+            if record.get('status') == 'ok' and record.get('key'):
+                future = Future()
+                future.set_result(record['recommendations'])
+                self.results.setdefault(record['key'], future)
+
+    def _generate(self, profile):
+        deadline = time.monotonic() + 300
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            with self.lock:
+                self.stats['gemini_calls'] += 1
+            try:
+                recs = request_ai_recommendations(*(profile.get(field) for field in PROFILE_FIELDS),
+                                                  session="batch", priority=PRIORITY_BATCH)
+                if not isinstance(recs, list) or not recs:
+                    raise ValueError("empty or invalid recommendation list")
+                return recs
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS or not is_retryable_error(e) or time.monotonic() > deadline:
+                    raise
+                time.sleep(backoff_delay(attempt))
+
+    def _resolve(self, key, profile):
+        # Identical normalized profiles share one future: cached result or one in-flight call.
+        with self.lock:
+            future = self.results.get(key)
+            owner = future is None
+            if owner:
+                future = self.results[key] = Future()
+        if not owner:
+            return future.result(), True
+        try:
+            recs = self._generate(profile)
+        except Exception as e:
+            future.set_exception(e)
+            with self.lock:
+                self.results.pop(key, None)  # let a later identical profile try again
+            raise
+        future.set_result(recs)
+        return recs, False
+
+    def _process(self, profile, out):
+        record = {'id': profile.get('id')}
+        try:
+            record['key'] = key = profile_key(profile)  # raises on a bad profile, e.g. a non-numeric age
+            recs, cached = self._resolve(key, profile)
+            record.update(status='ok', cached=cached, recommendations=recs)
+            stat = 'cached' if cached else 'generated'
+        except Exception as e:
+            record.update(status='error', error=f"{type(e).__name__}: {e}")
+            stat = 'failed'
+        with self.lock:
+            self.stats[stat] += 1
+            # Failed profiles are not checkpointed, so a rerun retries them.
+            if record['status'] == 'ok':
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            else:
+                print(f"error: profile {record['id']}: {record['error']}", file=sys.stderr)
+
+    def run(self, profiles):
+        started = time.monotonic()
+        with open(self.output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = []
+            for profile in profiles:
+                self.stats['total'] += 1
+                if not isinstance(profile, dict):
+                    with self.lock:
+                        self.stats['failed'] += 1
+                    print(f"error: profile {profile!r}: not a JSON object", file=sys.stderr)
+                    continue
+                if str(profile.get('id')) in self.done_ids:
+                    self.stats['resumed'] += 1
+                    continue
+                futures.append(pool.submit(self._process, profile, out))
+            for future in futures:
+                future.result()
+        elapsed = time.monotonic() - started
+        self.stats['elapsed_s'] = round(elapsed, 2)
+        processed = self.stats['generated'] + self.stats['cached'] + self.stats['failed']
+        self.stats['profiles_per_s'] = round(processed / elapsed, 3) if elapsed else None
+        self.stats['gemini_calls_per_min'] = round(self.stats['gemini_calls'] * 60 / elapsed, 2) if elapsed else None
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute AI recommendations for stored user profiles.")
+    parser.add_argument("input", help="profiles JSONL file")
+    parser.add_argument("-o", "--output", required=True, help="results JSONL file (also the resume checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel Gemini requests (default: 4)")
+    parser.add_argument("--rpm", type=float, default=10, help="Gemini requests per minute quota (default: 10)")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        parser.error("GEMINI_API_KEY is not set")
+    configure_gemini(api_key)
+
+    runner = BatchRunner(args.output, args.concurrency, args.rpm)
+    stats = runner.run(read_jsonl(args.input))
+    print(json.dumps(stats, indent=2), file=sys.stderr)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
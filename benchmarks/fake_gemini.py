@@ -0,0 +1,102 @@
+import json
+import random
+import re
+import threading
+import time
+
+# # Fake Gemini model
+# Installed with gemini_client.set_model_factory(FakeGenerativeModel). Answers
+# the app's kinds of prompts (recommendation JSON, character profile, batched
+# profiles JSON, single and batched vision) with canned text, streamed in chunks with configurable latency, and
+# can fail with 429s like a quota-limited key.
+
+CHUNK_CHARS = 40
+PROFILE_TEXT = "# 🌟 A Legend in the Making 🔥\n\n" + "This character is bold, loyal and never gives up on friends. " * 12
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = completion_tokens
+
+
+class _Response:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeGenerativeModel:
+    # Settings and counters are class-level: the app builds its own instances.
+    first_token_latency = 0.0
+    chunk_latency = 0.0
+    error_rate = 0.0
+    titles = [f"Anime Story {i}" for i in range(1, 40)]
+    calls = 0
+    errors = 0
+    _rng = random.Random(11)
+    _lock = threading.Lock()
+
+    def __init__(self, model_name, generation_config=None, **options):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+
+    @classmethod
+    def configure(cls, first_token_latency=0.0, chunk_latency=0.0, error_rate=0.0, titles=None):
+        cls.first_token_latency = first_token_latency
+        cls.chunk_latency = chunk_latency
+        cls.error_rate = error_rate
+        if titles:
+            cls.titles = list(titles)
+        cls.reset()
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.calls = 0
+            cls.errors = 0
+            cls._rng = random.Random(11)
+
+    def _answer(self, contents):
+        if isinstance(contents, list):
+            panels = re.search(r"numbered 1 to (\d+)", contents[0])
+            if panels:
+                return json.dumps([{'panel': n, 'characters': [{'name': "Naruto Uzumaki", 'confidence': 0.9}]}
+                                   for n in range(1, int(panels.group(1)) + 1)], indent=2)
+            return "Naruto Uzumaki"
+        if self.generation_config.get('response_mime_type') == "application/json":
+            if "mal_id" in json.dumps(self.generation_config.get('response_schema', {})):
+                return json.dumps([{'mal_id': int(mal_id), 'profile': PROFILE_TEXT}
+                                   for mal_id in re.findall(r"mal_id: (\d+)", contents)], indent=2)
+            with self._lock:
+                picks = self._rng.sample(self.titles, 5)
+            return json.dumps([{'title': t, 'genre': "Action, Adventure", 'reason': f"{t} fits your mood."}
+                               for t in picks], indent=2)
+        return PROFILE_TEXT
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        with self._lock:
+            FakeGenerativeModel.calls += 1
+            failed = self.error_rate and self._rng.random() < self.error_rate
+            if failed:
+                FakeGenerativeModel.errors += 1
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        if failed:
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        text = self._answer(contents)
+        usage = _Usage(len(str(contents)) // 4, len(text) // 4)
+        if not stream:
+            return _Response(text, usage)
+        return self._stream(text, usage)
+
+    def _stream(self, text, usage):
+        pieces = [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+        for i, piece in enumerate(pieces):
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield _Response(piece, usage if i == len(pieces) - 1 else None)
@@ -0,0 +1,178 @@
+import io
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+from PIL import Image
+
+# # Fake Jikan server
+# A deterministic stand-in for api.jikan.moe/v4 covering the endpoints the app
+# uses, plus cover images. Latency and 429 responses can be injected; every
+# request is counted so benchmarks can report outbound calls.
+
+GENRES = [(1, "Action"), (2, "Adventure"), (4, "Comedy"), (8, "Drama"), (10, "Fantasy"), (7, "Mystery"),
+          (22, "Romance"), (24, "Sci-Fi"), (36, "Slice of Life"), (37, "Supernatural"), (14, "Horror"),
+          (41, "Suspense"), (12, "Hentai")]
+THEMES = [(18, "Mecha"), (23, "School"), (40, "Psychological"), (62, "Isekai"), (63, "Iyashikei")]
+CHARACTER_NAMES = ["Naruto Uzumaki", "Sasuke Uchiha", "Monkey D. Luffy", "Roronoa Zoro", "Levi Ackerman",
+                   "Eren Yeager", "Mikasa Ackerman", "Light Yagami", "Edward Elric", "Spike Spiegel",
+                   "Gon Freecss", "Killua Zoldyck", "Saitama", "Tanjiro Kamado", "Nezuko Kamado"]
+
+
+def _build_items(content_type, count, base_url, rng):
+    items = []
+    for i in range(1, count + 1):
+        genres = rng.sample(GENRES[:-1], 3) if i % 25 else [GENRES[-1]]
+        year = 1980 + i % 45
+        dates = {'from': f"{year}-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00+00:00"}
+        items.append({
+            'mal_id': i,
+            'url': f"https://myanimelist.net/{content_type}/{i}",
+            'images': {'jpg': {'image_url': f"{base_url}/img/{content_type}/{i}.jpg",
+                               'large_image_url': f"{base_url}/img/{content_type}/{i}l.jpg"}},
+            'title': f"{content_type.title()} Title {i}",
+            'title_english': f"{content_type.title()} Story {i}" if i % 3 else None,
+            'type': "TV" if content_type == "anime" else "Manga",
+            'score': round(rng.uniform(5.0, 9.3), 2) if i % 11 else None,
+            'members': rng.randint(1000, 3_000_000),
+            'synopsis': f"Synopsis of title {i}. " * rng.randint(3, 30),
+            'rating': "PG-13 - Teens 13 or older" if content_type == "anime" else None,
+            ('aired' if content_type == "anime" else 'published'): dates,
+            'genres': [{'mal_id': g, 'name': n, 'type': content_type} for g, n in genres],
+            'themes': [{'mal_id': g, 'name': n, 'type': content_type} for g, n in rng.sample(THEMES, 1)],
+            'demographics': [],
+            'explicit_genres': [],
+        })
+    return items
+
+
+def _build_characters(base_url):
+    return [{
+        'mal_id': 1000 + i,
+        'url': f"https://myanimelist.net/character/{1000 + i}",
+        'images': {'jpg': {'image_url': f"{base_url}/img/character/{1000 + i}.jpg"}},
+        'name': name,
+        'name_kanji': None,
+        'nicknames': [],
+        'favorites': 100000 - i * 1000,
+        'about': f"{name} is a character. " * 40,
+    } for i, name in enumerate(CHARACTER_NAMES)]
+
+
+class FakeJikan:
+    def __init__(self, items_per_type=300, latency=0.0, error_rate=0.0, seed=7):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        data_rng = random.Random(seed)
+        self.items = {t: _build_items(t, items_per_type, self.base_url, data_rng) for t in ("anime", "manga")}
+        self.characters = _build_characters(self.base_url)
+        buf = io.BytesIO()
+        Image.new("RGB", (225, 320), (90, 60, 140)).save(buf, "JPEG", quality=85)
+        self.image = buf.getvalue()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-jikan").start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _inject_error(self):
+        with self._lock:
+            return self.error_rate and self._rng.random() < self.error_rate
+
+    def route(self, path, query):
+        # Returns (status, body dict).
+        parts = [p for p in path.split("/") if p]
+        if parts[:1] == ["genres"]:
+            return 200, {'data': [{'mal_id': g, 'name': n, 'count': 100} for g, n in GENRES + THEMES]}
+        if parts == ["characters"]:
+            q = (query.get('q') or "").casefold()
+            hits = [c for c in self.characters if q and q in c['name'].casefold()]
+            return 200, {'data': hits[:int(query.get('limit', 10))]}
+        if parts[:1] == ["random"] and len(parts) == 2 and parts[1] in self.items:
+            with self._lock:
+                item = self._rng.choice(self.items[parts[1]])
+            return 200, {'data': item}
+        if parts[:1] == ["top"] and len(parts) == 2 and parts[1] in self.items:
+            items = sorted(self.items[parts[1]], key=lambda x: -(x['score'] or 0))
+            return 200, self._page(items, query)
+        if len(parts) == 1 and parts[0] in self.items:
+            return 200, self._page(self._search(self.items[parts[0]], query), query)
+        return 404, {'status': 404, 'message': "Not Found"}
+
+    def _search(self, items, query):
+        q = (query.get('q') or "").casefold()
+        if q:
+            items = [x for x in items if q in x['title'].casefold() or q in (x['title_english'] or "").casefold()]
+        genre_ids = {int(g) for g in (query.get('genres') or "").split(",") if g}
+        if genre_ids:
+            items = [x for x in items if genre_ids <= {g['mal_id'] for g in x['genres'] + x['themes']}]
+        order_by = query.get('order_by')
+        if order_by in ('score', 'start_date', 'mal_id'):
+            def key(x):
+                if order_by == 'start_date':
+                    return (x.get('aired') or x.get('published'))['from']
+                return x[order_by] or 0
+            items = sorted(items, key=key, reverse=query.get('sort') == 'desc')
+        return items
+
+    @staticmethod
+    def _page(items, query):
+        page, limit = int(query.get('page', 1)), int(query.get('limit', 25))
+        last = max(1, -(-len(items) // limit))
+        chunk = items[(page - 1) * limit:page * limit]
+        return {'data': chunk, 'pagination': {
+            'last_visible_page': last, 'has_next_page': page < last, 'current_page': page,
+            'items': {'count': len(chunk), 'total': len(items), 'per_page': limit}}}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                kind = "img" if url.path.startswith("/img/") else url.path.strip("/").split("/")[0]
+                with fake._lock:
+                    fake.calls[kind] += 1
+                if kind == "img":
+                    self._send(200, fake.image, "image/jpeg")
+                    return
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake._inject_error():
+                    self._send(429, b'{"status": 429}', "application/json", {"Retry-After": "0"})
+                    return
+                status, body = fake.route(url.path, dict(parse_qsl(url.query)))
+                self._send(status, json.dumps(body).encode("utf-8"), "application/json")
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                with fake._lock:
+                    fake.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,325 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_gemini import FakeGenerativeModel
+from benchmarks.fake_jikan import FakeJikan
+
+# # Page benchmarks
+# Runs each page of main.py through Streamlit's AppTest against a local fake
+# Jikan server and a fake Gemini model, and reports per-rerun wall time,
+# rendered payload size, outbound calls and cache hit rates:
+#
+#     python -m benchmarks.run                      # compare with benchmarks/baseline.json
+#     python -m benchmarks.run --update-baseline    # record a new baseline
+#
+# Every scenario runs --iterations times in a fresh session; the first
+# iteration is "cold" (empty process caches), the rest are "warm".
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+RUN_TIMEOUT = 120
+TIME_FLOOR_MS = 20     # smaller differences are noise, whatever the ratio
+COLD_FLOOR_MS = 200    # cold runs are single samples and noisier
+SETTLE_SECONDS = 0.3   # background work (prefetch, pool refills) is attributed to the step that started it
+SETTLE_TIMEOUT = 10
+
+
+def _click(label=None, key=None, optional=False):
+    # `optional`: the button may be gone on warm runs (e.g. nothing left to prepare).
+    def action(at):
+        if key is not None:
+            try:
+                button = at.button(key=key)
+            except KeyError:
+                if optional:
+                    return
+                raise
+            button.click()
+            return
+        for button in at.button:
+            if button.label == label:
+                button.click()
+                return
+        raise LookupError(f"no button labelled {label!r}")
+    return action
+
+
+def _steps(*actions):
+    def action(at):
+        for step in actions:
+            step(at)
+    return action
+
+
+def _seed_favorites(fake, uid):
+    from favorites_store import FavoritesStore
+    media = [{'mal_id': item['mal_id'], 'title': item['title'], 'score': item['score'],
+              'image_url': item['images']['jpg']['image_url'], 'url': item['url'], 'type': 'Anime'}
+             for item in fake.items['anime'][:12]]
+    characters = [{'mal_id': c['mal_id'], 'title': c['name'], 'image_url': c['images']['jpg']['image_url'],
+                   'url': c['url'], 'type': 'Character'} for c in fake.characters[:4]]
+    FavoritesStore(uid).import_items({'media': media, 'characters': characters}, replace=True)
+
+
+SCENARIOS = {
+    'home': [
+        ("load", None),
+        ("shuffle", _click("🔄 Shuffle New")),
+    ],
+    'genre': [
+        ("load", None),
+        ("search", _steps(lambda at: at.multiselect(key="genre_selection").set_value(["Action"]),
+                          _click("🔍 Start Searching"))),
+        ("next_page", _click(key="genre_next")),
+    ],
+    'wiki': [
+        ("load", None),
+        ("search", _steps(lambda at: at.text_input(key="search_input").input("Naruto"), _click("🔍 Search"))),
+        ("analyze", _click(key="analyze_btn")),
+    ],
+    'wiki_batch': [
+        ("load", None),
+        ("search", _steps(lambda at: at.text_input(key="search_input").input("a"), _click("🔍 Search"))),
+        ("prepare_all", _click(key="analyze_all_btn", optional=True)),
+    ],
+    'recommend': [
+        ("load", None),
+        ("generate", _steps(lambda at: at.text_area(key="rec_interests").input("mecha, space and cats"),
+                            _click("✨ Generate Recommendations"))),
+    ],
+    'favorites': [
+        ("load", None),
+    ],
+}
+
+
+# Scenarios that are not named after the page they run on.
+SCENARIO_PAGES = {'wiki_batch': 'wiki'}
+
+
+def _walk(node):
+    yield node
+    children = getattr(node, "children", None) or {}
+    for child in children.values():
+        yield from _walk(child)
+
+
+def payload_bytes(at):
+    # Size of the element protos the rerun produced, i.e. what goes to the browser.
+    total = 0
+    for node in _walk(at._tree):
+        proto = getattr(node, "proto", None)
+        if proto is not None and hasattr(proto, "ByteSize"):
+            total += proto.ByteSize()
+    return total
+
+
+class Counters:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def settle(self):
+        # Waits until no outbound call has happened for SETTLE_SECONDS.
+        deadline = time.monotonic() + SETTLE_TIMEOUT
+        last = (self.fake.total_calls(), FakeGenerativeModel.calls)
+        while time.monotonic() < deadline:
+            time.sleep(SETTLE_SECONDS)
+            current = (self.fake.total_calls(), FakeGenerativeModel.calls)
+            if current == last:
+                return
+            last = current
+
+    def read(self):
+        from metrics import metrics
+        calls = dict(self.fake.calls)
+        caches = metrics.snapshot()["caches"]
+        return {
+            'jikan_calls': sum(n for kind, n in calls.items() if kind != "img"),
+            'image_calls': calls.get("img", 0),
+            'gemini_calls': FakeGenerativeModel.calls,
+            'hits': sum(c['hits'] for c in caches.values()),
+            'misses': sum(c['misses'] for c in caches.values()),
+            'caches': {name: (c['hits'], c['misses']) for name, c in caches.items()},
+        }
+
+    @staticmethod
+    def delta(before, after):
+        result = {k: after[k] - before[k] for k in ('jikan_calls', 'image_calls', 'gemini_calls', 'hits', 'misses')}
+        lookups = result['hits'] + result['misses']
+        result['cache_hit_ratio'] = round(result['hits'] / lookups, 3) if lookups else None
+        per_cache = {}
+        for name, (hits, misses) in after['caches'].items():
+            old_hits, old_misses = before['caches'].get(name, (0, 0))
+            if hits + misses - old_hits - old_misses:
+                per_cache[name] = round((hits - old_hits) / (hits + misses - old_hits - old_misses), 3)
+        result['caches'] = per_cache
+        return result
+
+
+def run_scenario(name, steps, iteration, counters, fake):
+    from streamlit.testing.v1 import AppTest
+    # Deprecation notices are logged on every rerun and would bury the report.
+    logging.getLogger("streamlit.deprecation_util").setLevel(logging.ERROR)
+
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=RUN_TIMEOUT)
+    at.secrets["GEMINI_API_KEY"] = "benchmark"
+    uid = f"{iteration:04d}{'0' * 28}"
+    at.query_params["uid"] = uid
+    at.session_state["current_page"] = SCENARIO_PAGES.get(name, name)
+    if name == "favorites":
+        _seed_favorites(fake, uid)
+
+    rows = []
+    for label, action in steps:
+        if action is not None:
+            action(at)
+        before = counters.read()
+        started = time.perf_counter()
+        at.run()
+        wall_ms = (time.perf_counter() - started) * 1000
+        counters.settle()
+        row = {'scenario': name, 'step': label, 'iteration': iteration, 'wall_ms': round(wall_ms, 1),
+               'payload_bytes': payload_bytes(at), 'exceptions': len(at.exception)}
+        row.update(Counters.delta(before, counters.read()))
+        rows.append(row)
+        if at.exception:
+            print(f"warning: {name}/{label}: {at.exception[0].value}", file=sys.stderr)
+    return rows
+
+
+def summarize(rows):
+    summary = {}
+    keys = sorted({(r['scenario'], r['step']) for r in rows}, key=lambda k: list(SCENARIOS).index(k[0]))
+    for scenario, step in keys:
+        runs = sorted((r for r in rows if (r['scenario'], r['step']) == (scenario, step)), key=lambda r: r['iteration'])
+        cold, warm = runs[0], runs[1:] or runs[:1]
+        summary[f"{scenario}/{step}"] = {
+            'cold_ms': cold['wall_ms'],
+            'warm_ms': min(r['wall_ms'] for r in warm),   # best of the warm runs is the least noisy
+            'payload_bytes': cold['payload_bytes'],
+            'jikan_calls': cold['jikan_calls'],
+            'gemini_calls': cold['gemini_calls'],
+            'warm_jikan_calls': max(r['jikan_calls'] for r in warm),
+            'warm_gemini_calls': max(r['gemini_calls'] for r in warm),
+            'warm_cache_hit_ratio': warm[-1]['cache_hit_ratio'],
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    # Returns a list of human-readable regressions.
+    regressions = []
+    for key, current in summary.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        for metric, ratio, floor in (('cold_ms', 2 * tolerance, COLD_FLOOR_MS), ('warm_ms', tolerance, TIME_FLOOR_MS)):
+            if current[metric] > old[metric] * (1 + ratio) and current[metric] - old[metric] > floor:
+                regressions.append(f"{key}: {metric} {old[metric]} -> {current[metric]}")
+        for metric in ('payload_bytes',):
+            if current[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{key}: {metric} {old[metric]} -> {current[metric]}")
+        for metric in ('jikan_calls', 'gemini_calls', 'warm_jikan_calls', 'warm_gemini_calls'):
+            if current[metric] > old.get(metric, 0):
+                regressions.append(f"{key}: {metric} {old.get(metric, 0)} -> {current[metric]}")
+    return regressions
+
+
+def print_rows(rows):
+    header = f"{'scenario/step':<22}{'iter':>5}{'wall ms':>10}{'payload':>10}{'jikan':>7}{'img':>6}{'gemini':>8}{'hit %':>7}  caches"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        ratio = "-" if r['cache_hit_ratio'] is None else f"{r['cache_hit_ratio'] * 100:.0f}"
+        caches = " ".join(f"{name}={value * 100:.0f}%" for name, value in sorted(r['caches'].items()))
+        print(f"{r['scenario'] + '/' + r['step']:<22}{r['iteration']:>5}{r['wall_ms']:>10.1f}"
+              f"{r['payload_bytes']:>10}{r['jikan_calls']:>7}{r['image_calls']:>6}{r['gemini_calls']:>8}{ratio:>7}  {caches}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's pages against local Jikan/Gemini stand-ins.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset to run")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--jikan-latency", type=float, default=0.05, help="seconds per fake Jikan API response")
+    parser.add_argument("--jikan-error-rate", type=float, default=0.0, help="fraction of Jikan responses that are 429")
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="seconds to first Gemini token")
+    parser.add_argument("--gemini-chunk-latency", type=float, default=0.02, help="seconds between streamed chunks")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="fraction of Gemini calls that fail with 429")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the real Jikan and Gemini rate limits")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative slowdown (default 0.3)")
+    parser.add_argument("--json", help="also write raw per-rerun rows to this file")
+    args = parser.parse_args(argv)
+
+    # The app reads its configuration at import time, so the environment is set
+    # up before anything from the app is imported.
+    fake = FakeJikan(latency=args.jikan_latency, error_rate=args.jikan_error_rate).start()
+    os.environ["ITOOK_DATA_DIR"] = tempfile.mkdtemp(prefix="itook-bench-")
+    os.environ["JIKAN_BASE_URL"] = fake.base_url
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    os.chdir(ROOT)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    import ai_service
+    import gemini_client
+    import jikan_client
+    import thumbnails
+    from rate_limit import RateLimiter
+
+    FakeGenerativeModel.configure(args.gemini_latency, args.gemini_chunk_latency, args.gemini_error_rate,
+                                  titles=[item['title_english'] or item['title'] for item in fake.items['anime']])
+    gemini_client.set_model_factory(FakeGenerativeModel)
+    thumbnails.ALLOWED_HOSTS = thumbnails.ALLOWED_HOSTS + ("127.0.0.1",)
+    thumbnails.STATIC_DIR = os.path.join(os.environ["ITOOK_DATA_DIR"], "static")
+    if not args.rate_limit:
+        jikan_client.get_client().limiter = RateLimiter([(1000, 1000)])
+        ai_service.scheduler.configure(60000, burst=1000)
+
+    counters = Counters(fake)
+    rows = []
+    selected = [s for s in args.scenarios.split(",") if s]
+    for iteration in range(1, args.iterations + 1):
+        for name in selected:
+            rows.extend(run_scenario(name, SCENARIOS[name], iteration, counters, fake))
+    fake.stop()
+
+    rows.sort(key=lambda r: (list(SCENARIOS).index(r['scenario']), r['iteration']))
+    print_rows(rows)
+    summary = summarize(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'rows': rows, 'summary': summary}, f, indent=2)
+
+    config = {k: getattr(args, k) for k in ('iterations', 'jikan_latency', 'jikan_error_rate', 'gemini_latency',
+                                            'gemini_chunk_latency', 'gemini_error_rate', 'rate_limit')}
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({'config': config, 'results': summary}, f, indent=2)
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("\nno baseline to compare against (run with --update-baseline)")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print(f"\nwarning: baseline was recorded with different settings: {baseline.get('config')}", file=sys.stderr)
+    regressions = compare(summary, baseline['results'], args.tolerance)
+    if regressions:
+        print("\nregressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nno regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
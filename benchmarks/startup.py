@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# # Startup benchmark
+# Measures what a new server process and every rerun cost before a page has
+# done any real work, on pages that need neither Jikan nor Gemini:
+#
+#     python -m benchmarks.startup             # report and check the budgets
+#     python -m benchmarks.startup --top 30    # longer import-time profile
+#
+# Each sample is a fresh interpreter started with `-X importtime`, so module
+# caches are really cold. Reported per page: time to import Streamlit, time
+# of the first script run (app imports + session setup), median of the
+# following reruns, and which heavy SDKs got loaded although the page never
+# uses them. Exits with 1 when a budget is exceeded.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ("favorites", "history", "contact")
+RERUNS = 10
+RESULT_PREFIX = "STARTUP_RESULT "
+
+# Budgets. Streamlit's own import (~0.4s here) is outside the app's control
+# and reported separately.
+FIRST_RUN_TARGET_MS = 500
+RERUN_TARGET_MS = 50
+# Must stay unloaded until a page actually needs them.
+LAZY_MODULES = ("google.generativeai", "numpy", "PIL", "requests")
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def _child(page):
+    # Runs in the fresh interpreter; prints one JSON result line on stdout.
+    os.environ["ITOOK_DATA_DIR"] = tempfile.mkdtemp(prefix="itook-startup-")
+    os.environ["JIKAN_BASE_URL"] = "http://127.0.0.1:9"   # nothing listens: light pages must not call out
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    os.chdir(ROOT)
+
+    import logging
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = (time.perf_counter() - started) * 1000
+    logging.getLogger("streamlit.deprecation_util").setLevel(logging.ERROR)
+
+    # AppTest compiles the script afresh on every run; a server compiles it once
+    # and reuses the bytecode, so share one cache the way the server does.
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+    shared_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: shared_cache
+
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=60)
+    at.secrets["GEMINI_API_KEY"] = "benchmark"
+    at.query_params["uid"] = "0" * 32
+    at.session_state["current_page"] = page
+
+    started = time.perf_counter()
+    at.run()
+    first_run_ms = (time.perf_counter() - started) * 1000
+    rerun_ms = []
+    for _ in range(RERUNS):
+        started = time.perf_counter()
+        at.run()
+        rerun_ms.append((time.perf_counter() - started) * 1000)
+
+    print(RESULT_PREFIX + json.dumps({
+        'page': page,
+        'streamlit_ms': round(streamlit_ms, 1),
+        'first_run_ms': round(first_run_ms, 1),
+        'rerun_ms': round(statistics.median(rerun_ms), 1),
+        'loaded': [m for m in LAZY_MODULES if m in sys.modules],
+        'exceptions': [str(e.value) for e in at.exception],
+    }), flush=True)
+
+
+def parse_importtime(stderr):
+    # Returns {top-level module: (self_us, cumulative_us)}.
+    modules = {}
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def sample(page):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-m", "benchmarks.startup", "--child", page],
+                          cwd=ROOT, capture_output=True, text=True, timeout=300)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):]), parse_importtime(proc.stderr)
+    raise RuntimeError(f"startup child for {page!r} failed:\n{proc.stderr[-2000:]}")
+
+
+def app_modules():
+    return {name[:-3] for name in os.listdir(ROOT) if name.endswith(".py")}
+
+
+def print_profile(page, imports, top):
+    ours = app_modules()
+    print(f"\nslowest top-level imports (cumulative, first sample of {page}):")
+    ranked = sorted(imports.items(), key=lambda kv: -kv[1][1])[:top]
+    for name, (self_us, cumulative_us) in ranked:
+        tag = "  (app)" if name.split(".")[0] in ours else ""
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {name}{tag}")
+    app_total = sum(cumulative for name, (_, cumulative) in imports.items() if name.split(".")[0] in ours)
+    print(f"  app modules in total: {app_total / 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold start and per-rerun overhead of light pages.")
+    parser.add_argument("--pages", default=",".join(PAGES), help="comma-separated subset of pages")
+    parser.add_argument("--samples", type=int, default=3, help="fresh processes per page; the best one counts")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the import-time profile")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.child)
+        return 0
+
+    failures = []
+    profile = None   # (page, imports) of the first sample
+    header = f"{'page':<12}{'streamlit ms':>14}{'first run ms':>14}{'rerun ms':>10}  heavy modules loaded"
+    print(header)
+    print("-" * len(header))
+    for page in [p for p in args.pages.split(",") if p]:
+        results = []
+        for _ in range(args.samples):
+            result, imports = sample(page)
+            results.append(result)
+            profile = profile or (page, imports)
+        best = {
+            'streamlit_ms': min(r['streamlit_ms'] for r in results),
+            'first_run_ms': min(r['first_run_ms'] for r in results),
+            'rerun_ms': min(r['rerun_ms'] for r in results),
+            'loaded': sorted({m for r in results for m in r['loaded']}),
+        }
+        print(f"{page:<12}{best['streamlit_ms']:>14.1f}{best['first_run_ms']:>14.1f}{best['rerun_ms']:>10.1f}"
+              f"  {', '.join(best['loaded']) or '-'}")
+        for r in results:
+            failures.extend(f"{page}: exception: {e}" for e in r['exceptions'])
+        if best['first_run_ms'] > FIRST_RUN_TARGET_MS:
+            failures.append(f"{page}: first run {best['first_run_ms']} ms > {FIRST_RUN_TARGET_MS} ms")
+        if best['rerun_ms'] > RERUN_TARGET_MS:
+            failures.append(f"{page}: rerun {best['rerun_ms']} ms > {RERUN_TARGET_MS} ms")
+        if best['loaded']:
+            failures.append(f"{page}: loaded {', '.join(best['loaded'])} without using it")
+
+    if profile:
+        print_profile(*profile, args.top)
+    if failures:
+        print("\nover budget:")
+        for line in sorted(set(failures)):
+            print(f"  {line}")
+        return 1
+    print(f"\nwithin budget (first run <= {FIRST_RUN_TARGET_MS} ms, rerun <= {RERUN_TARGET_MS} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
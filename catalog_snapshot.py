@@ -0,0 +1,253 @@
+import json
+import math
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import storage
+
+# # Catalog snapshot
+# A columnar, memory-mapped copy of the whole Jikan catalog written by
+# crawl_catalog.py. One directory per content type holds a .npy file per
+# column (fixed-width numbers, packed genre bitsets, and strings as a UTF-8
+# byte blob plus offsets) and a meta.json. Plain .npy rather than .npz so every
+# column can be opened with mmap_mode="r": startup costs a few page faults,
+# not a full read. Genre filtering and score/date sorting then run locally.
+
+SNAPSHOT_VERSION = 1
+SYNOPSIS_CHARS = 260
+
+NUMERIC_COLUMNS = {
+    'mal_id': np.int32,
+    'score': np.float32,       # NaN when unscored
+    'members': np.int32,
+    'start_date': np.int32,    # YYYYMMDD, 0 when unknown
+    'sfw': np.bool_,
+}
+STRING_COLUMNS = ('title', 'title_english', 'image_url', 'synopsis')
+
+EXCLUDED_GENRES = {'Hentai', 'Erotica'}
+MAL_URL = "https://myanimelist.net/{content_type}/{mal_id}"
+
+
+def snapshot_path(content_type):
+    return storage.data_path("catalog", content_type)
+
+
+def _tags(item):
+    for field in ('genres', 'explicit_genres', 'themes', 'demographics'):
+        for tag in item.get(field) or []:
+            if tag.get('mal_id') is not None:
+                yield tag
+
+
+def compact_record(item):
+    # The subset of a Jikan /anime or /manga entry the snapshot keeps.
+    dates = item.get('aired') or item.get('published') or {}
+    synopsis = item.get('synopsis') or ""
+    if len(synopsis) > SYNOPSIS_CHARS:
+        synopsis = synopsis[:SYNOPSIS_CHARS] + "..."
+    return {
+        'mal_id': item.get('mal_id'),
+        'title': item.get('title') or "",
+        'title_english': item.get('title_english') or "",
+        'image_url': (item.get('images') or {}).get('jpg', {}).get('image_url') or "",
+        'synopsis': synopsis,
+        'score': item.get('score'),
+        'members': item.get('members') or 0,
+        'start_date': (dates.get('from') or "")[:10],
+        'rating': item.get('rating') or "",
+        'genres': [[tag['mal_id'], tag.get('name')] for tag in _tags(item)],
+    }
+
+
+def _date_int(text):
+    try:
+        year, month, day = text.split("-")
+        return int(year) * 10000 + int(month) * 100 + int(day)
+    except ValueError:
+        return 0
+
+
+def write_snapshot(content_type, records):
+    # Builds the columns in a temp directory and swaps it into place, so a
+    # running app never sees a half-written snapshot.
+    records = sorted({r['mal_id']: r for r in records if r.get('mal_id') is not None}.values(),
+                     key=lambda r: r['mal_id'])
+    genre_names = {}
+    for record in records:
+        for genre_id, name in record['genres']:
+            genre_names.setdefault(genre_id, name)
+    genre_ids = sorted(genre_names)
+    bit_of = {genre_id: i for i, genre_id in enumerate(genre_ids)}
+
+    columns = {
+        'mal_id': [r['mal_id'] for r in records],
+        'score': [r['score'] if r['score'] is not None else math.nan for r in records],
+        'members': [r['members'] for r in records],
+        'start_date': [_date_int(r['start_date']) for r in records],
+        'sfw': [not (r['rating'].startswith("Rx") or any(name in EXCLUDED_GENRES for _, name in r['genres']))
+                for r in records],
+    }
+    bits = np.zeros((len(records), max(len(genre_ids), 1)), dtype=bool)
+    for row, record in enumerate(records):
+        for genre_id, _ in record['genres']:
+            bits[row, bit_of[genre_id]] = True
+
+    final = snapshot_path(content_type)
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, dtype in NUMERIC_COLUMNS.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(columns[name], dtype=dtype))
+    np.save(os.path.join(tmp, "genre_bits.npy"), np.packbits(bits, axis=1))
+    for name in STRING_COLUMNS:
+        encoded = [r[name].encode("utf-8") for r in records]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        np.save(os.path.join(tmp, f"{name}.offsets.npy"), offsets)
+        np.save(os.path.join(tmp, f"{name}.bytes.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'content_type': content_type,
+        'count': len(records),
+        'created_at': time.time(),
+        'genres': [[genre_id, genre_names[genre_id]] for genre_id in genre_ids],
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    old = final + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(final):
+        os.rename(final, old)
+    os.rename(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+class Snapshot:
+    ORDERS = ('score', 'start_date')
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.content_type = self.meta['content_type']
+        self.genres = {genre_id: name for genre_id, name in self.meta['genres']}
+        self.bit_of = {genre_id: i for i, (genre_id, _) in enumerate(self.meta['genres'])}
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.columns = {name: load(name) for name in NUMERIC_COLUMNS}
+        self.genre_bits = load("genre_bits")
+        self.strings = {name: (load(f"{name}.offsets"), load(f"{name}.bytes")) for name in STRING_COLUMNS}
+        self._orders = {}
+
+    def __len__(self):
+        return self.meta['count']
+
+    def genre_map(self):
+        return {name: genre_id for genre_id, name in self.genres.items() if name not in EXCLUDED_GENRES}
+
+    def string(self, name, row):
+        offsets, blob = self.strings[name]
+        return bytes(blob[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def _order(self, order_by, sort):
+        # Full-catalog sort orders are computed once and reused by every filter.
+        key = (order_by, sort)
+        order = self._orders.get(key)
+        if order is None:
+            values = np.asarray(self.columns[order_by], dtype=np.float64)
+            missing = np.isnan(values) | (values == 0) if order_by == 'start_date' else np.isnan(values)
+            ranked = -values if sort == 'desc' else values
+            # Unknown values sort last either way; ties fall back to mal_id.
+            order = np.lexsort((np.asarray(self.columns['mal_id']), np.where(missing, np.inf, ranked)))
+            self._orders[key] = order
+        return order
+
+    def supports(self, query):
+        return (set(query) <= {'genres', 'order_by', 'sort'}
+                and query.get('order_by', 'score') in self.ORDERS
+                and all(int(g) in self.bit_of for g in _genre_ids(query)))
+
+    def filter(self, genre_ids):
+        # All selected genres must be present (Jikan's semantics for ?genres=a,b).
+        mask = np.asarray(self.columns['sfw']).copy()
+        for genre_id in genre_ids:
+            bit = self.bit_of[int(genre_id)]
+            mask &= (self.genre_bits[:, bit // 8] & (0x80 >> (bit % 8))) != 0
+        return mask
+
+    def search(self, query):
+        # Returns the matching row numbers in result order.
+        order = self._order(query.get('order_by', 'score'), query.get('sort', 'desc'))
+        mask = self.filter(_genre_ids(query))
+        return order[mask[order]]
+
+    def item(self, row):
+        mal_id = int(self.columns['mal_id'][row])
+        score = float(self.columns['score'][row])
+        start = int(self.columns['start_date'][row])
+        image_url = self.string('image_url', row)
+        return {
+            'mal_id': mal_id,
+            'title': self.string('title', row),
+            'title_english': self.string('title_english', row) or None,
+            'synopsis': self.string('synopsis', row) or None,
+            'score': None if math.isnan(score) else round(score, 2),
+            'members': int(self.columns['members'][row]),
+            'start_date': f"{start // 10000:04d}-{start // 100 % 100:02d}-{start % 100:02d}" if start else None,
+            'images': {'jpg': {'image_url': image_url or None}},
+            'url': MAL_URL.format(content_type=self.content_type, mal_id=mal_id),
+            'genres': [],
+        }
+
+    def page(self, query, page=1, page_size=10):
+        # Same shape as a Jikan search page: {'data': [...], 'pagination': {...}}.
+        rows = self.search(query)
+        total = len(rows)
+        last_page = max(1, -(-total // page_size))
+        start = (page - 1) * page_size
+        data = [self.item(int(row)) for row in rows[start:start + page_size]]
+        return {
+            'data': data,
+            'pagination': {
+                'current_page': page,
+                'last_visible_page': last_page,
+                'has_next_page': page < last_page,
+                'items': {'count': len(data), 'total': total, 'per_page': page_size},
+            },
+        }
+
+
+def _genre_ids(query):
+    return [g for g in str(query.get('genres') or "").split(",") if g]
+
+
+_lock = threading.Lock()
+_loaded = {}   # content_type -> (meta mtime, Snapshot or None)
+
+
+def load_snapshot(content_type):
+    # Process-wide; reopened only when the crawler publishes a new snapshot.
+    meta_path = os.path.join(snapshot_path(content_type), "meta.json")
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    with _lock:
+        cached = _loaded.get(content_type)
+        if cached is None or cached[0] != mtime:
+            try:
+                snapshot = Snapshot(snapshot_path(content_type))
+                if snapshot.meta.get('version') != SNAPSHOT_VERSION:
+                    snapshot = None
+            except (OSError, ValueError, KeyError):
+                snapshot = None
+            cached = _loaded[content_type] = (mtime, snapshot)
+        return cached[1]
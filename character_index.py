@@ -0,0 +1,166 @@
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from metrics import metrics
+import storage
+
+# # Local character search index
+# Every character payload fetched from Jikan is upserted here (SQLite for
+# persistence, an in-memory trigram index for lookups). Queries match names,
+# kanji and nicknames by exact word, prefix or trigram similarity, so
+# "naruto", "Naruto " and "Narto" are answered locally once Naruto is known.
+
+DB_NAME = "character_index.sqlite3"
+CONFIDENT_SCORE = 0.6   # below this the caller should ask Jikan
+STRONG_SCORE = 0.9      # exact name, word or prefix: no need to confirm with Jikan
+CANDIDATE_LIMIT = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    mal_id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    favorites INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_loaded = False
+_payloads = {}    # mal_id -> payload
+_aliases = {}     # mal_id -> [normalized alias, ...]
+_favorites = {}   # mal_id -> MAL favorites count, used to break ties
+_postings = {}    # trigram -> set(mal_id)
+
+
+def _db():
+    return storage.connect(DB_NAME, [_SCHEMA])
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _aliases_for(payload):
+    names = [payload.get('name'), payload.get('name_kanji')] + list(payload.get('nicknames') or [])
+    aliases = []
+    for name in names:
+        alias = normalize(name)
+        if alias and alias not in aliases:
+            aliases.append(alias)
+        # "Uzumaki Naruto" and "Naruto Uzumaki" are the same person.
+        words = alias.split()
+        if len(words) == 2:
+            swapped = f"{words[1]} {words[0]}"
+            if swapped not in aliases:
+                aliases.append(swapped)
+    return aliases
+
+
+def _grams_for(aliases):
+    grams = set()
+    for alias in aliases:
+        for word in [alias] + alias.split():
+            grams |= _trigrams(word)
+    return grams
+
+
+def _index(mal_id, payload):
+    for gram in _grams_for(_aliases.get(mal_id, [])):
+        _postings.get(gram, set()).discard(mal_id)
+    aliases = _aliases_for(payload)
+    _payloads[mal_id] = payload
+    _aliases[mal_id] = aliases
+    _favorites[mal_id] = payload.get('favorites') or 0
+    for gram in _grams_for(aliases):
+        _postings.setdefault(gram, set()).add(mal_id)
+
+
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    for mal_id, payload in _db().execute("SELECT mal_id, payload FROM characters"):
+        _index(mal_id, json.loads(payload))
+    _loaded = True
+
+
+def upsert_many(payloads):
+    rows = []
+    with _lock:
+        _load()
+        for payload in payloads:
+            mal_id = payload.get('mal_id')
+            if mal_id is None:
+                continue
+            _index(mal_id, payload)
+            rows.append((mal_id, json.dumps(payload), payload.get('favorites') or 0, time.time()))
+    if rows:
+        _db().executemany("INSERT OR REPLACE INTO characters VALUES (?, ?, ?, ?)", rows)
+
+
+def _dice(a, b):
+    ga, gb = _trigrams(a), _trigrams(b)
+    return 2 * len(ga & gb) / (len(ga) + len(gb))
+
+
+def _score(query, alias):
+    if query == alias:
+        return 1.0
+    words = alias.split()
+    if query in words:
+        return 0.95
+    if alias.startswith(query):
+        return 0.9
+    query_words = query.split()
+    if all(any(w.startswith(q) for w in words) for q in query_words):
+        return 0.85
+    # Typo tolerance: every query word has to resemble some word of the alias and
+    # the weakest one counts, so a shared first or last name alone ("Sakura Haruno"
+    # vs "Sakura Kinomoto") stays below CONFIDENT_SCORE. Capped so a fuzzy hit
+    # never outranks a real prefix match.
+    weakest = min(max(_dice(q, w) for w in words) for q in query_words)
+    return min(0.8, max(_dice(query, alias), weakest))
+
+
+def search(query, limit=10):
+    # Returns [(score, payload), ...], best first.
+    query = normalize(query)
+    if not query:
+        return []
+    with _lock:
+        _load()
+        counts = Counter()
+        for gram in _trigrams(query) | {g for w in query.split() for g in _trigrams(w)}:
+            counts.update(_postings.get(gram, ()))
+        scored = []
+        for mal_id, _ in counts.most_common(CANDIDATE_LIMIT):
+            score = max(_score(query, alias) for alias in _aliases[mal_id])
+            scored.append((score, _favorites.get(mal_id, 0), mal_id))
+        scored.sort(reverse=True)
+        return [(score, _payloads[mal_id]) for score, _, mal_id in scored[:limit]]
+
+
+def lookup(query, limit=10):
+    # Confident local hits as [(score, payload), ...], or None when the caller
+    # should fall back to Jikan.
+    hits = search(query, limit)
+    confident = [(score, payload) for score, payload in hits if score >= CONFIDENT_SCORE]
+    metrics.record_cache("character_index", bool(confident))
+    return confident or None
+
+
+def size():
+    with _lock:
+        _load()
+        return len(_payloads)
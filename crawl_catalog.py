@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from catalog_snapshot import compact_record, write_snapshot
+from jikan_client import get_client, JikanError
+import storage
+
+# # Catalog crawler
+# Pages through Jikan's /anime and /manga listings and publishes a columnar
+# snapshot (see catalog_snapshot.py) that the app memory-maps:
+#
+#     python crawl_catalog.py anime manga
+#
+# Requests go through the shared Jikan client, so the crawl stays within the
+# API rate limits. Progress is checkpointed after every page: an interrupted
+# crawl resumes where it stopped on the next run.
+
+PAGE_LIMIT = 25
+CONTENT_TYPES = ("anime", "manga")
+
+
+class Crawl:
+    def __init__(self, content_type):
+        self.content_type = content_type
+        self.checkpoint_path = storage.data_path("catalog", "crawl", f"{content_type}.json")
+        self.records_path = storage.data_path("catalog", "crawl", f"{content_type}.jsonl")
+        self.state = {'next_page': 1, 'last_page': None, 'started_at': time.time()}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def reset(self):
+        for path in (self.checkpoint_path, self.records_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.state = {'next_page': 1, 'last_page': None, 'started_at': time.time()}
+
+    def _save_state(self):
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def fetch_page(self, page):
+        # Ordered by id so pages stay stable while the crawl is running.
+        payload = get_client().get_json(f"/{self.content_type}", params={
+            'page': page, 'limit': PAGE_LIMIT, 'order_by': 'mal_id', 'sort': 'asc'})
+        pagination = payload.get('pagination', {})
+        return payload.get('data', []), pagination.get('last_visible_page', page), pagination.get('has_next_page', False)
+
+    def run(self, max_pages=None):
+        client_calls = 0
+        started = time.monotonic()
+        while True:
+            page = self.state['next_page']
+            last_page = self.state['last_page']
+            if last_page is not None and page > last_page:
+                break
+            if max_pages is not None and page > max_pages:
+                break
+            items, last_page, has_next = self.fetch_page(page)
+            client_calls += 1
+            # Records first, then the checkpoint: a crash between the two only
+            # re-fetches one page, and duplicates are dropped when the snapshot is built.
+            with open(self.records_path, "a", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps(compact_record(item), ensure_ascii=False) + "\n")
+            self.state['next_page'] = page + 1
+            self.state['last_page'] = last_page if has_next else page
+            self._save_state()
+            elapsed = time.monotonic() - started
+            print(f"{self.content_type}: page {page}/{self.state['last_page']} "
+                  f"({client_calls / elapsed * 60:.0f} pages/min)", file=sys.stderr)
+        return self.complete()
+
+    def complete(self):
+        last_page = self.state['last_page']
+        return last_page is not None and self.state['next_page'] > last_page
+
+    def records(self):
+        if not os.path.exists(self.records_path):
+            return []
+        with open(self.records_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def publish(self):
+        meta = write_snapshot(self.content_type, self.records())
+        if self.complete():
+            # A finished crawl starts over next time, which refreshes the snapshot.
+            self.reset()
+        return meta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl the Jikan catalog into a local columnar snapshot.")
+    parser.add_argument("content_types", nargs="*", default=list(CONTENT_TYPES), choices=CONTENT_TYPES,
+                        help="what to crawl (default: anime manga)")
+    parser.add_argument("--max-pages", type=int, help="stop after this page (a partial snapshot is still published)")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start from page 1")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for content_type in args.content_types:
+        crawl = Crawl(content_type)
+        if args.restart:
+            crawl.reset()
+        try:
+            crawl.run(max_pages=args.max_pages)
+        except JikanError as e:
+            print(f"error: {content_type} crawl stopped at page {crawl.state['next_page']}: {e} "
+                  f"(rerun to resume)", file=sys.stderr)
+            status = 1
+            continue
+        meta = crawl.publish()
+        print(f"{content_type}: snapshot with {meta['count']} titles written", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import json
+import time
+
+import storage
+
+# # Favorites store
+# Per-user favorites kept as id-keyed maps (O(1) membership checks, insertion
+# order = order added) and mirrored to SQLite so they survive closed tabs and
+# server restarts.
+
+DB_NAME = "favorites.sqlite3"
+CATEGORIES = ('media', 'characters')
+EXPORT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS favorites (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (user_id, category, item_id)
+)
+"""
+
+
+def _db():
+    return storage.connect(DB_NAME, [_SCHEMA])
+
+
+def item_key(item_id):
+    return str(item_id)
+
+
+class FavoritesStore:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.items = {category: {} for category in CATEGORIES}
+        rows = _db().execute(
+            "SELECT category, item_id, payload FROM favorites WHERE user_id = ? ORDER BY added_at",
+            (user_id,),
+        )
+        for category, item_id, payload in rows:
+            if category in self.items:
+                self.items[category][item_id] = json.loads(payload)
+
+    def contains(self, category, item_id):
+        return item_key(item_id) in self.items[category]
+
+    def list(self, category):
+        return list(self.items[category].values())
+
+    def count(self, category):
+        return len(self.items[category])
+
+    def add(self, category, item):
+        key = item_key(item.get('mal_id'))
+        self.items[category][key] = item
+        _db().execute(
+            "INSERT OR REPLACE INTO favorites VALUES (?, ?, ?, ?, ?)",
+            (self.user_id, category, key, json.dumps(item), time.time()),
+        )
+
+    def remove(self, category, item_id):
+        key = item_key(item_id)
+        self.items[category].pop(key, None)
+        _db().execute(
+            "DELETE FROM favorites WHERE user_id = ? AND category = ? AND item_id = ?",
+            (self.user_id, category, key),
+        )
+
+    def export_json(self):
+        return json.dumps({'version': EXPORT_VERSION, 'favorites': {c: self.list(c) for c in CATEGORIES}}, indent=2)
+
+    def import_items(self, favorites, replace=False):
+        # `favorites` is {category: [item, ...]}; returns how many items were imported.
+        rows = []
+        now = time.time()
+        # Built aside and swapped in after COMMIT, so a failed import leaves memory matching disk.
+        items = {category: {} if replace else dict(self.items[category]) for category in CATEGORIES}
+        for category in CATEGORIES:
+            for offset, item in enumerate(favorites.get(category) or []):
+                if item.get('mal_id') is None:
+                    continue
+                key = item_key(item['mal_id'])
+                items[category][key] = item
+                rows.append((self.user_id, category, key, json.dumps(item), now + offset * 1e-6))
+        conn = _db()
+        conn.execute("BEGIN")
+        try:
+            if replace:
+                conn.execute("DELETE FROM favorites WHERE user_id = ?", (self.user_id,))
+            conn.executemany("INSERT OR REPLACE INTO favorites VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.items = items
+        return len(rows)
+
+    def import_json(self, text, replace=False):
+        payload = json.loads(text)
+        favorites = payload.get('favorites', payload) if isinstance(payload, dict) else {}
+        return self.import_items(favorites, replace=replace)
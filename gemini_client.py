@@ -0,0 +1,143 @@
+import threading
+
+# # Process-wide Gemini clients
+# Models are configured once and reused by every session. Identical concurrent
+# requests are coalesced: the first caller starts one Gemini call in a worker
+# thread and every caller (including the first) replays its chunks.
+#
+# The SDK is heavy (most of a second to import), so it is only imported and
+# configured when the first model is built; pages that never call Gemini
+# don't pay for it.
+
+MODEL_NAME = 'gemini-2.0-flash'
+
+_lock = threading.Lock()
+_models = {}
+_api_key = None
+_configured_key = None
+_model_factory = None   # None = genai.GenerativeModel
+
+
+def set_model_factory(factory):
+    # Swaps the class models are built from (e.g. a stand-in for benchmarks);
+    # None restores the real SDK.
+    global _model_factory
+    with _lock:
+        _model_factory = factory
+        _models.clear()
+
+
+def configure(api_key):
+    # Cheap enough to call on every rerun: only records the key.
+    global _api_key
+    with _lock:
+        if api_key == _api_key:
+            return
+        _api_key = api_key
+        _models.clear()
+
+
+def _sdk_model_class():
+    # Imports and configures the SDK once per process (and again only if the key changes).
+    global _configured_key
+    import google.generativeai as genai
+    if _configured_key != _api_key:
+        genai.configure(api_key=_api_key)
+        _configured_key = _api_key
+    return genai.GenerativeModel
+
+
+def get_model(name=MODEL_NAME, **options):
+    key = (name, repr(sorted(options.items())))
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = _models[key] = (_model_factory or _sdk_model_class())(name, **options)
+    return model
+
+
+class _Flight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.followers = 0
+        self.abandoned = False  # every follower left before the end: the producer stops
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def _run(self, key, flight, factory):
+        chunks = None
+        try:
+            chunks = factory()
+            for chunk in chunks:
+                if flight.abandoned:
+                    break
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            if flight.abandoned and hasattr(chunks, "close"):
+                chunks.close()  # runs the producer's cleanup, e.g. giving back its queue ticket
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def stream(self, key, factory):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                threading.Thread(target=self._run, args=(key, flight, factory), daemon=True).start()
+            flight.followers += 1
+        return self._follow(key, flight)
+
+    def _follow(self, key, flight):
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.chunks) and not flight.done:
+                        flight.cond.wait()
+                    pending = flight.chunks[index:]
+                    done = flight.done
+                index += len(pending)
+                yield from pending
+                if done and index >= len(flight.chunks):
+                    break
+        finally:
+            self._leave(key, flight)
+        if flight.error is not None:
+            raise flight.error
+
+    def _leave(self, key, flight):
+        # The last follower closing early (e.g. the browser navigated away) stops
+        # the producer at its next item; later callers start a fresh flight.
+        with self._lock:
+            flight.followers -= 1
+            if flight.followers == 0 and not flight.done:
+                flight.abandoned = True
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def call(self, key, fn):
+        return next(iter(self.stream(key, lambda: iter([fn()]))))
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+flights = SingleFlight()
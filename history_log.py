@@ -0,0 +1,132 @@
+import time
+from datetime import datetime
+from itertools import islice
+
+import storage
+
+# # Activity history
+# Recent entries sit in a fixed-capacity ring buffer (O(1) append, no list
+# copies); every entry is also appended to a per-user SQLite log so history is
+# retained long-term and can be paged, filtered and aggregated in SQL.
+
+DB_NAME = "history.sqlite3"
+RING_CAPACITY = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    query TEXT,
+    details TEXT
+)
+"""
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS history_user_ts ON history (user_id, ts)",
+    "CREATE INDEX IF NOT EXISTS history_user_type_ts ON history (user_id, type, ts)",
+)
+
+
+def _db():
+    return storage.connect(DB_NAME, [_SCHEMA, *_INDEXES])
+
+
+class RingBuffer:
+    def __init__(self, capacity):
+        self.slots = [None] * capacity
+        self.start = 0
+        self.size = 0
+
+    def append(self, item):
+        capacity = len(self.slots)
+        self.slots[(self.start + self.size) % capacity] = item
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % capacity
+
+    def newest_first(self):
+        capacity = len(self.slots)
+        for i in range(self.size - 1, -1, -1):
+            yield self.slots[(self.start + i) % capacity]
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.start = self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+def _entry(ts, action_type, query, details):
+    return {
+        'timestamp': datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+        'ts': ts,
+        'type': action_type,
+        'query': query,
+        'details': details
+    }
+
+
+def _filters(user_id, action_types=None, since=None, until=None):
+    clauses, args = ["user_id = ?"], [user_id]
+    if action_types:
+        clauses.append(f"type IN ({','.join('?' * len(action_types))})")
+        args.extend(action_types)
+    if since is not None:
+        clauses.append("ts >= ?")
+        args.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        args.append(until)
+    return " AND ".join(clauses), args
+
+
+class ActivityHistory:
+    def __init__(self, user_id, capacity=RING_CAPACITY):
+        self.user_id = user_id
+        self.recent = RingBuffer(capacity)
+        rows = _db().execute(
+            "SELECT ts, type, query, details FROM history WHERE user_id = ? ORDER BY ts DESC, id DESC LIMIT ?",
+            (user_id, capacity),
+        ).fetchall()
+        for row in reversed(rows):
+            self.recent.append(_entry(*row))
+
+    def add(self, action_type, query, details=None):
+        ts = time.time()
+        self.recent.append(_entry(ts, action_type, query, details))
+        _db().execute(
+            "INSERT INTO history (user_id, ts, type, query, details) VALUES (?, ?, ?, ?, ?)",
+            (self.user_id, ts, action_type, query, details),
+        )
+
+    def query(self, action_types=None, since=None, until=None, limit=20, offset=0):
+        # Newest first. The first page of an unfiltered query is served from memory.
+        if not action_types and since is None and until is None and offset + limit <= len(self.recent):
+            return list(islice(self.recent.newest_first(), offset, offset + limit))
+        where, args = _filters(self.user_id, action_types, since, until)
+        rows = _db().execute(
+            f"SELECT ts, type, query, details FROM history WHERE {where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+            args + [limit, offset],
+        ).fetchall()
+        return [_entry(*row) for row in rows]
+
+    def count(self, action_types=None, since=None, until=None):
+        where, args = _filters(self.user_id, action_types, since, until)
+        return _db().execute(f"SELECT COUNT(*) FROM history WHERE {where}", args).fetchone()[0]
+
+    def counts_by_type(self, since=None, until=None):
+        where, args = _filters(self.user_id, None, since, until)
+        rows = _db().execute(
+            f"SELECT type, COUNT(*) FROM history WHERE {where} GROUP BY type ORDER BY COUNT(*) DESC", args
+        ).fetchall()
+        return dict(rows)
+
+    def clear(self):
+        self.recent.clear()
+        _db().execute("DELETE FROM history WHERE user_id = ?", (self.user_id,))
+
+    def __len__(self):
+        return len(self.recent)
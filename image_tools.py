@@ -0,0 +1,166 @@
+# # Image helpers for Gemini Vision
+# Gemini bills an image by 768x768 tiles, so anything larger than 768px on the
+# long side only costs more tokens and upload time; character recognition does
+# not need more detail than that.
+#
+# Batch identification sends several frames per image: contact sheets of
+# SHEET_COLUMNS x SHEET_COLUMNS numbered panels, each sheet exactly one tile.
+
+import os
+import tempfile
+from contextlib import closing
+
+VISION_MAX_SIDE = 768
+SHEET_COLUMNS = 2
+SHEET_TILE = VISION_MAX_SIDE // SHEET_COLUMNS
+KEYFRAME_INTERVAL = 1.0   # seconds between sampled frames of a clip
+KEYFRAME_MIN_CHANGE = 10  # dHash bits; frames closer than this to the last kept one are the same shot
+MAX_KEYFRAMES = 12
+VIDEO_TYPES = ("mp4", "mov", "webm", "mkv", "avi")
+
+
+def prepare_image(image_file, max_side=VISION_MAX_SIDE):
+    from PIL import Image, ImageOps
+    if hasattr(image_file, "seek"):
+        image_file.seek(0)
+    with Image.open(image_file) as src:
+        img = ImageOps.exif_transpose(src)
+        img = img.convert("RGB")
+    return _fit(img, max_side)
+
+
+def _fit(img, max_side):
+    from PIL import Image
+    img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    # Re-create from raw pixels so no EXIF/GPS/ICC metadata is sent along.
+    clean = Image.new("RGB", img.size)
+    clean.paste(img)
+    return clean
+
+
+def video_supported():
+    # Video clips need OpenCV, which is optional; animated GIF/WebP only need Pillow.
+    import importlib.util
+    return importlib.util.find_spec("cv2") is not None
+
+
+def extract_frames(upload, max_side=VISION_MAX_SIDE):
+    # Prepared frames of one upload: the image itself, or the keyframes of an
+    # animated image or video clip.
+    name = getattr(upload, "name", "") or ""
+    if os.path.splitext(name)[1].lower().lstrip(".") in VIDEO_TYPES:
+        return video_keyframes(upload, max_side)
+    from PIL import Image, ImageOps
+    if hasattr(upload, "seek"):
+        upload.seek(0)
+    with Image.open(upload) as src:
+        if getattr(src, "n_frames", 1) <= 1:
+            return [_fit(ImageOps.exif_transpose(src), max_side)]
+        return select_keyframes(_animation_frames(src), max_side=max_side)
+
+
+def video_keyframes(upload, max_side=VISION_MAX_SIDE):
+    if not video_supported():
+        raise RuntimeError("video clips need OpenCV (pip install opencv-python-headless)")
+    # OpenCV only reads from a path.
+    suffix = os.path.splitext(getattr(upload, "name", "") or "")[1] or ".mp4"
+    if hasattr(upload, "seek"):
+        upload.seek(0)
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(upload.read())
+        with closing(_video_frames(path, KEYFRAME_INTERVAL)) as frames:
+            return select_keyframes(frames, max_side=max_side)
+    finally:
+        os.remove(path)
+
+
+def select_keyframes(frames, interval=KEYFRAME_INTERVAL, min_change=KEYFRAME_MIN_CHANGE,
+                     max_frames=MAX_KEYFRAMES, max_side=VISION_MAX_SIDE):
+    # `frames` yields (seconds, PIL image). Samples one frame per `interval` and
+    # keeps it only if the picture changed since the last kept frame.
+    kept = []
+    last_hash = None
+    next_at = 0.0
+    for at, frame in frames:
+        if at < next_at:
+            continue
+        next_at = at + interval
+        img = _fit(frame, max_side)
+        phash = dhash(img)
+        if last_hash is not None and hamming(phash, last_hash) < min_change:
+            continue
+        kept.append(img)
+        last_hash = phash
+        if len(kept) >= max_frames:
+            break
+    return kept
+
+
+def _animation_frames(src):
+    from PIL import ImageSequence
+    at = 0.0
+    for frame in ImageSequence.Iterator(src):
+        yield at, frame
+        at += (frame.info.get("duration") or 100) / 1000
+
+
+def _video_frames(path, interval):
+    # Decodes only the sampled frames; grab() just advances the stream.
+    import cv2
+    from PIL import Image
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, round(fps * interval))
+        index = 0
+        while cap.grab():
+            if index % step == 0:
+                ok, bgr = cap.retrieve()
+                if ok:
+                    yield index / fps, Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+            index += 1
+    finally:
+        cap.release()
+
+
+def contact_sheet(images, first_label=1, columns=SHEET_COLUMNS, tile=SHEET_TILE):
+    # Packs frames into a grid of numbered panels (first_label, first_label + 1, ...
+    # left to right, top to bottom) so one image part carries several frames.
+    from PIL import Image, ImageDraw, ImageFont
+    rows = -(-len(images) // columns)
+    sheet = Image.new("RGB", (columns * tile, rows * tile), (0, 0, 0))
+    draw = ImageDraw.Draw(sheet)
+    try:
+        font = ImageFont.load_default(size=tile // 12)
+    except TypeError:  # Pillow < 10.1 has only the small bitmap font
+        font = ImageFont.load_default()
+    for i, img in enumerate(images):
+        x, y = (i % columns) * tile, (i // columns) * tile
+        thumb = img.copy()
+        thumb.thumbnail((tile, tile), Image.LANCZOS)
+        sheet.paste(thumb, (x + (tile - thumb.width) // 2, y + (tile - thumb.height) // 2))
+        label = str(first_label + i)
+        box = draw.textbbox((x + 8, y + 8), label, font=font)
+        draw.rectangle((box[0] - 4, box[1] - 4, box[2] + 4, box[3] + 4), fill=(255, 255, 255))
+        draw.text((x + 8, y + 8), label, fill=(0, 0, 0), font=font)
+    return sheet
+
+
+def dhash(img, hash_size=8):
+    # 64-bit difference hash: robust to rescaling and recompression, cheap to compute.
+    from PIL import Image
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
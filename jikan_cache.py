@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from urllib.parse import urlsplit, urlencode, parse_qsl
+
+from jikan_client import get_client, JikanError, JikanThrottled
+from metrics import metrics
+import storage
+
+# # Persistent Jikan response cache
+# SQLite-backed, shared by every Streamlit process on the host. Entries are keyed
+# by normalized URL, expire per endpoint, and are served stale for a while after
+# expiry while a background thread refreshes them. Errors are cached only briefly.
+# Every PURGE_EVERY writes (starting with the first one of a process) expired
+# rows are deleted and the table is cut to the MAX_ENTRIES most recent rows.
+
+DB_NAME = "jikan_cache.sqlite3"
+
+# (fresh TTL, extra stale-while-revalidate window) in seconds, by first path segment
+ENDPOINT_TTLS = {
+    "genres": (7 * 86400, 30 * 86400),
+    "characters": (86400, 7 * 86400),
+    "anime": (6 * 3600, 7 * 86400),
+    "manga": (6 * 3600, 7 * 86400),
+    "top": (6 * 3600, 2 * 86400),
+    "random": (0, 0),
+}
+DEFAULT_TTL = (3600, 86400)
+NEGATIVE_TTL = 60
+PURGE_EVERY = 200
+MAX_ENTRIES = 20000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body TEXT,
+    error TEXT,
+    status INTEGER,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL
+)
+"""
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def _db():
+    return storage.connect(DB_NAME, [_SCHEMA])
+
+
+def normalize_key(path, params=None):
+    url = get_client().url_for(path)
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    for k, v in (params or {}).items():
+        query.append((k, str(v)))
+    # Jikan search is case-insensitive, so "Naruto " and "naruto" share an entry.
+    query = sorted((k.strip().lower(), " ".join(v.split()).lower()) for k, v in query)
+    path_part = parts.path.rstrip("/").lower()
+    return f"{parts.netloc.lower()}{path_part}?{urlencode(query)}"
+
+
+def _ttls_for(path):
+    return ENDPOINT_TTLS.get(get_client().endpoint_for(path), DEFAULT_TTL)
+
+
+def _read(key):
+    return _db().execute(
+        "SELECT body, error, status, fresh_until, stale_until FROM responses WHERE key = ?", (key,)
+    ).fetchone()
+
+
+def _write(key, body=None, error=None, status=None, ttl=0, stale=0):
+    now = time.time()
+    _db().execute(
+        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, body, error, status, now, now + ttl, now + ttl + stale),
+    )
+    global _writes
+    with _writes_lock:
+        due = _writes % PURGE_EVERY == 0
+        _writes += 1
+    if due:
+        purge_expired()
+
+
+def _fetch_and_store(key, path, params, timeout):
+    ttl, stale = _ttls_for(path)
+    try:
+        data = get_client().get_json(path, params=params, timeout=timeout)
+    except JikanThrottled:
+        raise  # local back-pressure says nothing about the resource
+    except JikanError as e:
+        row = _read(key)
+        # Keep serving a good stale copy rather than overwriting it with an error.
+        if row is None or row[0] is None:
+            _write(key, error=str(e), status=e.status, ttl=NEGATIVE_TTL)
+        raise
+    _write(key, body=json.dumps(data), ttl=ttl, stale=stale)
+    return data
+
+
+def _single_flight(key, fn):
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait()
+        return None
+    try:
+        return fn()
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+def _refresh_in_background(key, path, params, timeout):
+    with _inflight_lock:
+        if key in _inflight:
+            return
+
+    def run():
+        try:
+            _single_flight(key, lambda: _fetch_and_store(key, path, params, timeout))
+        except JikanError:
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def cached_get(path, params=None, timeout=None):
+    ttl, _ = _ttls_for(path)
+    if ttl <= 0:
+        return get_client().get_json(path, params=params, timeout=timeout)
+
+    key = normalize_key(path, params)
+    for _ in range(2):
+        row = _read(key)
+        now = time.time()
+        if row is not None:
+            body, error, status, fresh_until, stale_until = row
+            if body is not None and now < stale_until:
+                metrics.record_cache("jikan", True)
+                if now >= fresh_until:
+                    _refresh_in_background(key, path, params, timeout)
+                return json.loads(body)
+            if error is not None and now < fresh_until:
+                metrics.record_cache("jikan", True)
+                raise JikanError(f"{error} (cached)", status=status)
+
+        metrics.record_cache("jikan", False)
+        # Miss: one thread fetches, concurrent callers wait and then re-read the row.
+        result = _single_flight(key, lambda: _fetch_and_store(key, path, params, timeout))
+        if result is not None:
+            return result
+    return _fetch_and_store(key, path, params, timeout)
+
+
+def clear_jikan_cache():
+    _db().execute("DELETE FROM responses")
+
+
+def purge_expired():
+    conn = _db()
+    conn.execute("DELETE FROM responses WHERE stale_until < ?", (time.time(),))
+    conn.execute(
+        "DELETE FROM responses WHERE key IN"
+        " (SELECT key FROM responses ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)", (MAX_ENTRIES,)
+    )
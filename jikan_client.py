@@ -0,0 +1,127 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import metrics
+from rate_limit import RateLimiter
+
+# # Shared Jikan HTTP client
+# One pooled keep-alive session and one rate limiter for the whole process,
+# so every Streamlit session shares Jikan's 3 req/s + 60 req/min budget.
+# `requests` is imported with the first client, not with this module.
+
+JIKAN_BASE_URL = os.environ.get("JIKAN_BASE_URL", "https://api.jikan.moe/v4").rstrip("/")
+JIKAN_LIMITS = [(3, 3)]      # (tokens/second, burst): 3 per second
+JIKAN_WINDOWS = [(60, 60)]   # (calls, seconds): at most 60 in any minute
+DEFAULT_TIMEOUT = 10
+MAX_RETRIES = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class JikanError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class JikanThrottled(JikanError):
+    # Our own limiter gave up waiting; Jikan was never asked, so nothing to cache.
+    pass
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class JikanClient:
+    def __init__(self, base_url=JIKAN_BASE_URL, timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES, pool_size=10):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.limiter = RateLimiter(JIKAN_LIMITS, JIKAN_WINDOWS)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/json", "User-Agent": "ITOOK-Library/1.0"})
+
+    def endpoint_for(self, path):
+        # First path segment after the API root, e.g. "characters" or "anime"; used as the metrics label.
+        url = self.url_for(path)
+        rest = url[len(self.base_url):] if url.startswith(self.base_url) else url.split("://", 1)[-1]
+        return rest.lstrip("/").split("/")[0].split("?")[0] or "root"
+
+    def url_for(self, path):
+        if path.startswith("http"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get_json(self, path, params=None, timeout=None):
+        import requests
+        url = self.url_for(path)
+        endpoint = self.endpoint_for(path)
+        timeout = timeout or self.timeout
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if not self.limiter.acquire(timeout=timeout):
+                raise JikanThrottled("Rate limit wait exceeded timeout", status=429)
+            started = time.monotonic()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+            except requests.RequestException as e:
+                metrics.record_call("jikan", endpoint, time.monotonic() - started, status=None)
+                last_error = JikanError(f"Connection error: {e}")
+                delay = min(2 ** attempt, 8) + random.uniform(0, 0.5)
+            else:
+                metrics.record_call("jikan", endpoint, time.monotonic() - started, status=response.status_code)
+                if response.status_code == 200:
+                    try:
+                        return response.json()
+                    except ValueError:
+                        raise JikanError("Invalid JSON from Jikan", status=200)
+                if response.status_code not in RETRY_STATUSES:
+                    raise JikanError(f"HTTP {response.status_code}", status=response.status_code)
+
+                last_error = JikanError(f"HTTP {response.status_code}", status=response.status_code)
+                delay = _retry_after_seconds(response)
+                if delay is None:
+                    delay = min(2 ** attempt, 8) + random.uniform(0, 0.5)
+                if response.status_code == 429:
+                    self.limiter.pause(delay)
+
+            if attempt < self.max_retries:
+                time.sleep(delay)
+
+        raise last_error
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = JikanClient()
+    return _client
+
+
+def jikan_get(path, params=None, timeout=None):
+    return get_client().get_json(path, params=params, timeout=timeout)
@@ -1,43 +1,234 @@
-import requests
-import streamlit as st
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from jikan_client import jikan_get, JikanError
+from jikan_cache import cached_get, ENDPOINT_TTLS, DEFAULT_TTL
+from metrics import metrics
+import character_index
+import thumbnails
+import storage
 
 # # Jikan API Services
+# Responses are cached on disk by jikan_cache (per-endpoint TTLs, short-lived
+# negative entries), so failures are no longer pinned for an hour.
 
-@st.cache_data(ttl=3600)
 def get_genre_map(content_type="anime"):
-    url = f"https://api.jikan.moe/v4/genres/{content_type}"
+    from catalog_snapshot import load_snapshot  # numpy; only pages that browse the catalog need it
+    snapshot = load_snapshot(content_type)
+    if snapshot is not None:
+        return snapshot.genre_map()
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json().get('data', [])
-            return {item['name']: item['mal_id'] for item in data}
-        return {}
-    except: return {}
-
-@st.cache_data(ttl=3600)
-def get_character_data(name):
-    url = f"https://api.jikan.moe/v4/characters?q={name}&limit=10"
+        data = cached_get(f"/genres/{content_type}").get('data', [])
+        return {item['name']: item['mal_id'] for item in data}
+    except JikanError: return {}
+
+def get_character_data(name, limit=10):
+    # The local index answers when its best hit is strong (exact name, word or
+    # prefix). Jikan is asked on a miss, and to confirm when the index only has
+    # fuzzy typo matches; those then follow Jikan's own results.
+    hits = character_index.lookup(name, limit=limit) or []
+    local = [payload for _, payload in hits]
+    if hits and hits[0][0] >= character_index.STRONG_SCORE:
+        if len(local) < limit:
+            # Namesakes the index doesn't know yet show up from the next search on.
+            _page_pool.submit(_search_characters, name)
+        return local
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json().get('data', [])
-        return []
-    except: return []
+        results = _search_characters(name)
+    except JikanError: return local
+    known = {c.get('mal_id') for c in results}
+    return (results + [c for c in local if c.get('mal_id') not in known])[:limit]
+
+def _search_characters(name):
+    results = cached_get("/characters", params={"q": name, "limit": 10}).get('data', [])
+    character_index.upsert_many(results)
+    return results
 
 def get_one_character_data(name):
-    results = get_character_data(name)
+    results = get_character_data(name, limit=1)
     return results[0] if results else None
 
-def get_random_manga_data():
-    url = "https://api.jikan.moe/v4/random/manga"
+# Paginated search results. Pages live in a bounded process-wide LRU of futures;
+# fetching page N schedules page N+1 in the background, so "Next" and "Previous"
+# are usually served from memory. Entries expire after PAGE_MAX_AGE (never later
+# than the endpoint's fresh TTL in jikan_cache), then the disk cache answers.
+PAGE_SIZE = 10
+PAGE_CACHE_SIZE = 64
+PAGE_MAX_AGE = 600
+_page_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="jikan-prefetch")
+_pages = OrderedDict()   # key -> (future, expires_at)
+_pages_lock = threading.Lock()
+
+def _page_key(content_type, query, page):
+    return (content_type, tuple(sorted(query.items())), page)
+
+def _fetch_page(content_type, query, page):
+    payload = cached_get(f"/{content_type}", params={**query, 'page': page, 'limit': PAGE_SIZE})
+    return {'data': payload.get('data', []), 'pagination': payload.get('pagination', {})}
+
+def _page_future(content_type, query, page):
+    key = _page_key(content_type, query, page)
+    now = time.monotonic()
+    with _pages_lock:
+        future, expires_at = _pages.get(key, (None, 0.0))
+        if future is None or expires_at <= now:
+            max_age = min(PAGE_MAX_AGE, ENDPOINT_TTLS.get(content_type, DEFAULT_TTL)[0])
+            future = _page_pool.submit(_fetch_page, content_type, query, page)
+            _pages[key] = (future, now + max_age)
+            _pages.move_to_end(key)
+            while len(_pages) > PAGE_CACHE_SIZE:
+                _pages.popitem(last=False)
+        else:
+            _pages.move_to_end(key)
+    return key, future
+
+def get_media_page(content_type, query, page=1):
+    # A crawled catalog snapshot answers genre filters and score/date sorts locally.
+    from catalog_snapshot import load_snapshot
+    snapshot = load_snapshot(content_type)
+    if snapshot is not None and snapshot.supports(query):
+        started = time.monotonic()
+        result = snapshot.page(query, page, PAGE_SIZE)
+        metrics.record_call("local", "catalog_page", time.monotonic() - started)
+        if result['pagination']['has_next_page']:
+            _prefetch_covers(snapshot.page(query, page + 1, PAGE_SIZE))
+        return result
+    key, future = _page_future(content_type, query, page)
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json().get('data', {})
-            # Filter explicit content
-            for genre in data.get('genres', []):
-                if genre['name'] in ['Hentai', 'Erotica', 'Harem']:
-                    return get_random_manga_data()
+        result = future.result()
+    except JikanError:
+        with _pages_lock:
+            if _pages.get(key, (None,))[0] is future:
+                del _pages[key]
+        raise
+    if result['pagination'].get('has_next_page'):
+        _, next_future = _page_future(content_type, query, page + 1)
+        next_future.add_done_callback(_prefetch_next_covers)
+    return result
+
+def _prefetch_next_covers(future):
+    if future.exception() is None:
+        _prefetch_covers(future.result())
+
+def _prefetch_covers(result):
+    # Covers of the next page are fetched into the thumbnail cache before "Next" is clicked.
+    thumbnails.prefetch([thumbnails.cover_url(item) for item in result['data']])
+
+# Enrichment lookups run in parallel; the shared client limiter still keeps the
+# whole process within Jikan's rate limit.
+ENRICH_WORKERS = 5
+_enrich_pool = ThreadPoolExecutor(max_workers=ENRICH_WORKERS, thread_name_prefix="jikan-enrich")
+
+MEDIA_SEARCH = {
+    "anime": ("anime", {}),
+    "manga": ("manga", {}),
+    "light novel": ("manga", {"type": "lightnovel"}),
+}
+
+def find_media(title, content_type="anime"):
+    endpoint, extra = MEDIA_SEARCH.get(content_type.lower(), ("anime", {}))
+    try:
+        results = cached_get(f"/{endpoint}", params={"q": title, "limit": 1, **extra}).get('data', [])
+    except JikanError: return None
+    return results[0] if results else None
+
+def enrich_recommendations(titles, content_type="anime"):
+    # Yields (index, media or None) in completion order, so callers can render incrementally.
+    futures = {_enrich_pool.submit(find_media, title, content_type): i for i, title in enumerate(titles)}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+def get_jikan_stats():
+    summary = metrics.service_summary("jikan")
+    summary['cache_hit_ratio'] = metrics.cache_hit_ratio("jikan")
+    return summary
+
+# # Manga of the Day
+# One pick per calendar day for the whole server, persisted so every worker and
+# restart shows the same title. "Shuffle New" draws from a pool of pre-vetted
+# random titles that a background thread keeps topped up.
+EXCLUDED_GENRES = {'Hentai', 'Erotica', 'Harem'}
+MAX_RANDOM_ATTEMPTS = 5
+SHUFFLE_POOL_TARGET = 8
+DAILY_DB = "daily_manga.sqlite3"
+
+_daily = {'day': None, 'manga': None}
+_daily_lock = threading.Lock()
+_pool = deque()
+_pool_lock = threading.Lock()
+_pool_refilling = False
+
+def _is_allowed(data):
+    # Filter explicit content
+    tags = data.get('genres', []) + data.get('explicit_genres', []) + data.get('themes', [])
+    return not any(tag.get('name') in EXCLUDED_GENRES for tag in tags)
+
+def get_random_manga_data(max_attempts=MAX_RANDOM_ATTEMPTS):
+    for _ in range(max_attempts):
+        try:
+            data = jikan_get("/random/manga").get('data', {})
+        except JikanError: return None
+        if data and _is_allowed(data):
             return data
-        return None
-    except: return None
\ No newline at end of file
+    return None
+
+def _refill_pool():
+    global _pool_refilling
+    try:
+        misses = 0
+        while len(_pool) < SHUFFLE_POOL_TARGET and misses < MAX_RANDOM_ATTEMPTS:
+            data = get_random_manga_data()
+            if data is None:
+                misses += 1
+                continue
+            with _pool_lock:
+                _pool.append(data)
+    finally:
+        with _pool_lock:
+            _pool_refilling = False
+
+def _ensure_pool_refill():
+    global _pool_refilling
+    with _pool_lock:
+        if _pool_refilling or len(_pool) >= SHUFFLE_POOL_TARGET:
+            return
+        _pool_refilling = True
+    threading.Thread(target=_refill_pool, daemon=True, name="manga-pool").start()
+
+def _take_from_pool():
+    with _pool_lock:
+        data = _pool.popleft() if _pool else None
+    _ensure_pool_refill()
+    return data
+
+def _daily_db():
+    return storage.connect(DAILY_DB, ["CREATE TABLE IF NOT EXISTS daily_manga (day TEXT PRIMARY KEY, payload TEXT NOT NULL)"])
+
+def get_daily_manga():
+    today = date.today().isoformat()
+    if _daily['day'] == today:
+        return _daily['manga']
+    with _daily_lock:
+        if _daily['day'] == today:
+            return _daily['manga']
+        conn = _daily_db()
+        row = conn.execute("SELECT payload FROM daily_manga WHERE day = ?", (today,)).fetchone()
+        if row is None:
+            manga = _take_from_pool() or get_random_manga_data()
+            if manga is None:
+                return None
+            # Another worker may have picked first; whichever row landed wins everywhere.
+            conn.execute("INSERT OR IGNORE INTO daily_manga VALUES (?, ?)", (today, json.dumps(manga)))
+            row = conn.execute("SELECT payload FROM daily_manga WHERE day = ?", (today,)).fetchone()
+        _daily['manga'] = json.loads(row[0])
+        _daily['day'] = today
+    _ensure_pool_refill()
+    return _daily['manga']
+
+def force_refresh_daily_manga():
+    # Per-session shuffle: instant when the pool has a title, one bounded fetch otherwise.
+    return _take_from_pool() or get_random_manga_data()
@@ -0,0 +1,64 @@
+import json
+
+# # Incremental JSON array parsing
+# Feeds text chunks from a streamed model response and hands back each
+# top-level array element as soon as its closing brace arrives, so callers can
+# render item 1 while item 5 is still being generated. Elements that complete
+# before a stream is cut off are kept; a dangling partial element is dropped.
+
+
+class ArrayItemParser:
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0          # next character of `buffer` to scan
+        self.depth = 0        # 1 = inside the top-level array
+        self.in_string = False
+        self.escaped = False
+        self.item_start = None
+        self.closed = False
+
+    def feed(self, text):
+        # Returns the list of elements completed by this chunk.
+        self.buffer += text
+        items = []
+        while self.pos < len(self.buffer) and not self.closed:
+            ch = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                # Anything before the array (a stray ```json fence, prose) is skipped.
+                if ch == "[":
+                    self.depth = 1
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                if self.depth == 1:
+                    self.item_start = self.pos
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.item_start is not None:
+                    items.append(self._decode(self.buffer[self.item_start:self.pos + 1]))
+                    self.item_start = None
+                elif self.depth == 0:
+                    self.closed = True
+            self.pos += 1
+        # Drop text that can no longer be part of an unfinished element.
+        keep = self.item_start if self.item_start is not None else self.pos
+        self.buffer = self.buffer[keep:]
+        self.pos -= keep
+        if self.item_start is not None:
+            self.item_start = 0
+        return [item for item in items if item is not None]
+
+    @staticmethod
+    def _decode(text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
@@ -0,0 +1,233 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from jikan_cache import cached_get
+from jikan_client import JikanError
+from metrics import metrics
+
+# # Local recommender
+# Scores a cached Jikan catalog (top titles per content type) against the
+# recommendation form without calling Gemini: a tag matrix (genres, themes,
+# demographics) is matched against weights derived from mood, style and
+# interest keywords, blended with score/popularity priors and filtered by age
+# rating. Used as the fallback when Gemini is unavailable and as an instant
+# first answer while the AI result streams in.
+
+CATALOG_PAGES = 4
+CATALOG_PAGE_SIZE = 25
+
+CATALOG_SOURCES = {
+    "anime": ("/top/anime", {}),
+    "manga": ("/top/manga", {}),
+    "light novel": ("/top/manga", {"type": "lightnovel"}),
+}
+
+MOOD_TAGS = {
+    "Happy": {"Comedy": 1.0, "Slice of Life": 0.6, "CGDCT": 0.5, "Iyashikei": 0.4},
+    "Sad": {"Drama": 1.0, "Romance": 0.4, "Slice of Life": 0.3, "Award Winning": 0.3},
+    "Adventurous": {"Adventure": 1.0, "Fantasy": 0.7, "Action": 0.5, "Isekai": 0.4},
+    "Chill": {"Slice of Life": 1.0, "Iyashikei": 0.8, "Gourmet": 0.5, "Comedy": 0.3},
+    "Dark/Mysterious": {"Mystery": 1.0, "Suspense": 0.8, "Psychological": 0.8, "Supernatural": 0.5, "Horror": 0.4},
+    "Romantic": {"Romance": 1.0, "Drama": 0.4, "Love Polygon": 0.4, "Comedy": 0.2},
+}
+STYLE_TAGS = {
+    "Action Packed": {"Action": 1.0, "Martial Arts": 0.5, "Super Power": 0.5, "Military": 0.3, "Mecha": 0.3},
+    "Slow Life": {"Slice of Life": 1.0, "Iyashikei": 0.8, "Gourmet": 0.4, "Workplace": 0.3},
+    "Mind Bending": {"Psychological": 1.0, "Mystery": 0.6, "Sci-Fi": 0.6, "Time Travel": 0.6, "Suspense": 0.4},
+    "Emotional": {"Drama": 1.0, "Romance": 0.4, "Award Winning": 0.3},
+    "Horror/Thriller": {"Horror": 1.0, "Suspense": 0.8, "Gore": 0.5, "Survival": 0.5, "Psychological": 0.3},
+}
+KEYWORD_TAG_WEIGHT = 0.8
+
+ADULT_TAGS = {"Hentai", "Erotica", "Harem", "Ecchi"}
+# Jikan anime ratings by ordinal; manga carry no rating and are treated as unrated (-1).
+RATING_LEVELS = {"G": 0, "PG": 1, "PG-13": 2, "R": 3, "R+": 4, "Rx": 5}
+
+# final = tag match + keyword hits + prior (score and popularity)
+W_TAGS, W_KEYWORDS, W_PRIOR = 0.55, 0.25, 0.20
+
+STOPWORDS = {"and", "the", "like", "love", "with", "for", "that", "this", "about", "really",
+             "very", "also", "into", "enjoy", "things", "stuff", "watch", "read", "some"}
+
+
+class Catalog:
+    def __init__(self, items):
+        self.items = items
+        self.tags = sorted({name for item in items for name in _tag_names(item)})
+        tag_index = {name: i for i, name in enumerate(self.tags)}
+        matrix = np.zeros((len(items), len(self.tags)), dtype=np.float32)
+        for row, item in enumerate(items):
+            for name in _tag_names(item):
+                matrix[row, tag_index[name]] = 1.0
+        counts = matrix.sum(axis=1, keepdims=True)
+        # Row-normalized so heavily tagged titles don't win on tag count alone.
+        self.matrix = matrix / np.sqrt(np.maximum(counts, 1.0))
+        self.tag_index = tag_index
+        self.texts = np.array([_search_text(item) for item in items], dtype=str)
+        self.adult = np.array([bool(ADULT_TAGS & set(_tag_names(item))) for item in items])
+        self.rating = np.array([_rating_level(item.get('rating')) for item in items], dtype=np.int8)
+        score = np.array([item.get('score') or 0.0 for item in items], dtype=np.float32)
+        members = np.array([item.get('members') or 0 for item in items], dtype=np.float32)
+        popularity = np.log1p(members) / max(float(np.log1p(members.max())) if len(items) else 1.0, 1.0)
+        self.prior = 0.6 * (score / 10.0) + 0.4 * popularity
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _tag_names(item):
+    names = []
+    for field in ('genres', 'explicit_genres', 'themes', 'demographics'):
+        names.extend(tag.get('name') for tag in item.get(field) or [] if tag.get('name'))
+    return names
+
+
+def _search_text(item):
+    titles = [item.get('title'), item.get('title_english')] + [t.get('title') for t in item.get('titles') or []]
+    return " ".join([t for t in titles if t] + [item.get('synopsis') or ""]).casefold()
+
+
+def _rating_level(rating):
+    if not rating:
+        return -1
+    return RATING_LEVELS.get(rating.split(" - ")[0].strip(), -1)
+
+
+def max_rating_for_age(age):
+    if age is None:
+        return RATING_LEVELS["PG-13"]
+    if age < 13:
+        return RATING_LEVELS["PG"]
+    if age < 17:
+        return RATING_LEVELS["PG-13"]
+    return RATING_LEVELS["R"]
+
+
+def interest_keywords(interests):
+    words = re.findall(r"[a-z0-9][a-z0-9-]+", (interests or "").casefold())
+    return [w for w in dict.fromkeys(words) if len(w) >= 3 and w not in STOPWORDS]
+
+
+def _query_vector(catalog, mood, style, keywords):
+    q = np.zeros(len(catalog.tags), dtype=np.float32)
+    for weights in (MOOD_TAGS.get(mood, {}), STYLE_TAGS.get(style, {})):
+        for name, weight in weights.items():
+            i = catalog.tag_index.get(name)
+            if i is not None:
+                q[i] = max(q[i], weight)
+    # Interest words that name a tag ("mecha", "music", "space") boost that tag directly.
+    for i, name in enumerate(catalog.tags):
+        lowered = name.casefold()
+        if any(kw == lowered or kw in lowered.split() or lowered.startswith(kw) for kw in keywords):
+            q[i] = max(q[i], KEYWORD_TAG_WEIGHT)
+    norm = float(np.linalg.norm(q))
+    return q / norm if norm else q
+
+
+def score_catalog(catalog, age, interests, mood, style):
+    keywords = interest_keywords(interests)
+    tag_match = catalog.matrix @ _query_vector(catalog, mood, style, keywords)
+    if keywords:
+        hits = sum((np.char.find(catalog.texts, kw) >= 0).astype(np.float32) for kw in keywords)
+        keyword_match = hits / len(keywords)
+    else:
+        keyword_match = np.zeros(len(catalog), dtype=np.float32)
+    scores = W_TAGS * tag_match + W_KEYWORDS * keyword_match + W_PRIOR * catalog.prior
+    allowed = ~catalog.adult & (catalog.rating <= max_rating_for_age(age))
+    return np.where(allowed, scores, -np.inf)
+
+
+def _reason(catalog, row, mood, style):
+    wanted = set(MOOD_TAGS.get(mood, {})) | set(STYLE_TAGS.get(style, {}))
+    tags = _tag_names(catalog.items[row])
+    matched = [t for t in tags if t in wanted]
+    score = catalog.items[row].get('score')
+    parts = []
+    if matched:
+        parts.append(f"Fits your {mood.lower()} mood and taste for {style.lower()}: {', '.join(matched[:3])}.")
+    else:
+        parts.append("A highly rated pick related to your interests.")
+    if score:
+        parts.append(f"Rated {score} on MyAnimeList.")
+    return " ".join(parts)
+
+
+def recommend(age, interests, mood, style, content_type, k=5, timeout=None):
+    # Returns up to k recommendation dicts (same shape as the AI ones plus the
+    # Jikan payload under 'media'), or [] when the catalog isn't available in time.
+    catalog = get_catalog(content_type, timeout=timeout)
+    if not catalog:
+        return []
+    started = time.monotonic()
+    scores = score_catalog(catalog, age, interests, mood, style)
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    recs = []
+    for row in top:
+        item = catalog.items[int(row)]
+        recs.append({
+            'title': item.get('title_english') or item.get('title'),
+            'genre': ", ".join(tag['name'] for tag in item.get('genres') or []) or "N/A",
+            'reason': _reason(catalog, int(row), mood, style),
+            'mal_id': item.get('mal_id'),
+            'source': 'local',
+            'media': item,
+        })
+    metrics.record_call("local", "recommend", time.monotonic() - started)
+    return recs
+
+
+# Catalogs load once per content type in a background thread (Jikan pages come
+# from the on-disk response cache after the first run).
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="catalog-loader")
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def _catalog_items(content_type):
+    path, extra = CATALOG_SOURCES.get(content_type, CATALOG_SOURCES["anime"])
+    items, seen = [], set()
+    for page in range(1, CATALOG_PAGES + 1):
+        try:
+            payload = cached_get(path, params={**extra, 'page': page, 'limit': CATALOG_PAGE_SIZE})
+        except JikanError:
+            break
+        for item in payload.get('data', []):
+            if item.get('mal_id') not in seen:
+                seen.add(item.get('mal_id'))
+                items.append(item)
+        if not payload.get('pagination', {}).get('has_next_page'):
+            break
+    return items
+
+
+def _load_catalog(content_type):
+    items = _catalog_items(content_type)
+    if not items:
+        raise JikanError(f"no catalog items for {content_type}")
+    return Catalog(items)
+
+
+def warm_catalog(content_type):
+    content_type = content_type.lower()
+    with _catalogs_lock:
+        future = _catalogs.get(content_type)
+        if future is None or (future.done() and future.exception() is not None):
+            future = _catalogs[content_type] = _loader.submit(_load_catalog, content_type)
+    return future
+
+
+def get_catalog(content_type, timeout=None):
+    # timeout=0 only returns an already loaded catalog.
+    future = warm_catalog(content_type)
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        return None
@@ -1,82 +1,161 @@
 import streamlit as st
-import google.generativeai as genai
-import requests
-import json
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import hashlib
+import hmac
 import re
 import os
-import time
-from datetime import datetime, date
+import uuid
+from datetime import datetime, date, timedelta
+from urllib.parse import quote
 from style_css import set_global_style
+from favorites_store import FavoritesStore
+from history_log import ActivityHistory
+from jikan_client import JikanError
+from metrics import export_json, export_prometheus
+from thumbnails import thumbnail_url, thumbnail_urls, cover_url, DETAIL_WIDTH
+from image_tools import video_supported, VIDEO_TYPES
 
 from jikan_services import (
     get_genre_map, 
     get_character_data, 
     get_one_character_data, 
+    get_media_page,
+    enrich_recommendations,
     get_daily_manga,
     force_refresh_daily_manga,
     get_jikan_stats
 )
 
 from ai_service import (
+    configure_gemini,
     ai_vision_detect, 
+    ai_vision_batch,
     generate_ai_stream, 
-    get_ai_recommendations,
+    generate_profiles,
+    profile_batches,
+    RetryChunk,
+    ErrorChunk,
+    QueueChunk,
+    QuotaBusy,
+    estimate_ai_wait,
+    PRIORITY_RECOMMEND,
+    PRIORITY_VISION,
+    stream_ai_recommendations,
     get_api_stats,
+    is_profile_cached,
+    get_analysis_cache_size,
     clear_analysis_cache
 )
 
 st.set_page_config(page_title="ITOOK Library", layout="wide", page_icon="📚")
 
-if "GEMINI_API_KEY" in st.secrets:
-    API_KEY = st.secrets["GEMINI_API_KEY"]
-elif "GEMINI_API_KEY" in os.environ:
-    API_KEY = os.environ["GEMINI_API_KEY"]
-else:
+def get_secret(name):
+    # st.secrets raises (rather than reporting a missing key) when there is no secrets.toml at all.
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except FileNotFoundError:
+        pass
+    return os.environ.get(name)
+
+def get_api_key():
+    return get_secret("GEMINI_API_KEY")
+
+def admin_unlocked():
+    # Operator-only controls. They need ITOOK_ADMIN_KEY (secrets.toml or env);
+    # without one configured they are never offered.
+    admin_key = get_secret("ITOOK_ADMIN_KEY")
+    if not admin_key:
+        return False
+    entered = st.text_input("🔐 Admin key", type="password", key="admin_key_input")
+    return hmac.compare_digest(entered.encode("utf-8"), str(admin_key).encode("utf-8"))
+
+API_KEY = get_api_key()
+if not API_KEY:
     st.error("API Key is missing. Please check secrets.toml.")
     st.stop()
 
-genai.configure(api_key=API_KEY)
+# Only records the key; the Gemini SDK is imported and configured once per process on first use.
+configure_gemini(API_KEY)
 
-if 'current_page' not in st.session_state:
-    st.session_state.current_page = 'home'
+SESSION_DEFAULTS = {
+    'current_page': 'home',
+    'show_upgrade_modal': False,
+    'random_manga_item': None,
+    'manga_date': None,
+    'recommendations': None,
+    'rec_enrichment': {},
+    'genre_search_results': None,
+    'genre_searching': False,
+    'genre_page': 1,
+    'genre_pagination': None,
+    'ai_recommending': False,
+}
 
-if 'show_upgrade_modal' not in st.session_state:
-    st.session_state.show_upgrade_modal = False
+def auth_configured():
+    # Streamlit's OIDC login is available when secrets.toml has an [auth] section.
+    try:
+        return "auth" in st.secrets
+    except FileNotFoundError:
+        return False
 
-if 'favorites' not in st.session_state:
-    st.session_state.favorites = {'media': [], 'characters': []}
-elif isinstance(st.session_state.favorites, list):
-    old_favs = st.session_state.favorites
-    st.session_state.favorites = {'media': [], 'characters': []}
-    for item in old_favs:
-        if item.get('type') == 'Character':
-            st.session_state.favorites['characters'].append(item)
-        else:
-            st.session_state.favorites['media'].append(item)
-
-if 'search_history' not in st.session_state:
-    st.session_state.search_history = []
+def get_user_id():
+    # Signed-in users are identified by their account, so favorites and history
+    # follow them and stay private. Everyone else gets an anonymous id carried
+    # in the URL: the data is tied to that link (reloads and bookmarks keep it)
+    # and anyone holding the link can see it; show_identity_notice says so.
+    if st.user.get("is_logged_in"):
+        subject = f"{st.user.get('iss', '')}|{st.user.get('sub') or st.user.get('email')}"
+        return hashlib.sha256(subject.encode("utf-8")).hexdigest()[:32]
+    uid = st.query_params.get("uid", "")
+    if not re.fullmatch(r"[0-9a-f]{32}", uid):
+        uid = uuid.uuid4().hex
+        st.query_params["uid"] = uid
+    return uid
 
-if 'random_manga_item' not in st.session_state:
-    st.session_state.random_manga_item = None
+def get_quota_session():
+    # Fairness key for the shared Gemini queue (per-session pending cap and round
+    # robin). It is the server-side session id, which the client can't choose the
+    # way it can choose the `uid` in the URL.
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else get_user_id()
 
-if 'manga_date' not in st.session_state:
-    st.session_state.manga_date = None
+def show_identity_notice():
+    if st.user.get("is_logged_in"):
+        who = st.user.get("email") or st.user.get("name") or "your account"
+        st.caption(f"🔐 Saved to {who}.")
+        if st.button("Log out", key="logout_btn"):
+            st.logout()
+        return
+    st.caption("🔗 Saved under this page's link, not an account: bookmark it to come back, "
+               "and share it only with people who may see this data.")
+    if auth_configured() and st.button("🔐 Log in to keep it private", key="login_btn"):
+        st.login()
 
-if 'recommendations' not in st.session_state:
-    st.session_state.recommendations = None
+def init_session_state():
+    # Runs once per browser session; later reruns skip straight to the page.
+    for key, value in SESSION_DEFAULTS.items():
+        if key not in st.session_state:
+            st.session_state[key] = value.copy() if isinstance(value, dict) else value
 
-if 'character_analysis_cache' not in st.session_state:
-    st.session_state.character_analysis_cache = {}
+    if not isinstance(st.session_state.get('favorites'), FavoritesStore):
+        old_favs = st.session_state.get('favorites')
+        st.session_state.favorites = FavoritesStore(get_user_id())
+        if isinstance(old_favs, list):
+            st.session_state.favorites.import_items({
+                'characters': [i for i in old_favs if i.get('type') == 'Character'],
+                'media': [i for i in old_favs if i.get('type') != 'Character'],
+            })
+        elif isinstance(old_favs, dict):
+            st.session_state.favorites.import_items(old_favs)
 
-if 'genre_search_results' not in st.session_state:
-    st.session_state.genre_search_results = None
+    if not isinstance(st.session_state.get('search_history'), ActivityHistory):
+        st.session_state.search_history = ActivityHistory(get_user_id())
 
-if 'genre_searching' not in st.session_state:
-    st.session_state.genre_searching = False
+    st.session_state.session_ready = True
 
-if 'ai_recommending' not in st.session_state:
-    st.session_state.ai_recommending = False
+if not st.session_state.get('session_ready'):
+    init_session_state()
 
 def navigate_to(page):
     st.session_state.show_upgrade_modal = False
@@ -88,40 +167,29 @@ def navigate_to(page):
         st.session_state.analyzing = False
     if page == 'genre':
         st.session_state.genre_search_results = None
+        st.session_state.genre_pagination = None
+        st.session_state.genre_page = 1
         st.session_state.genre_searching = False
     if page == 'recommend':
         st.session_state.recommendations = None
+        st.session_state.rec_enrichment = {}
+        st.session_state.rec_warning = None
         st.session_state.ai_recommending = False
     st.session_state.current_page = page
     st.rerun()
 
 def add_to_history(action_type, query, details=None):
-    entry = {
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'type': action_type,
-        'query': query,
-        'details': details
-    }
-    st.session_state.search_history.insert(0, entry)
-    if len(st.session_state.search_history) > 50:
-        st.session_state.search_history = st.session_state.search_history[:50]
+    st.session_state.search_history.add(action_type, query, details)
 
 def is_favorited(item_id, category):
-    for item in st.session_state.favorites[category]:
-        current_id = item.get('mal_id') or item.get('id')
-        if str(current_id) == str(item_id):
-            return True
-    return False
+    return st.session_state.favorites.contains(category, item_id)
 
 def toggle_favorite(data, category='media'):
     item_id = data.get('mal_id') or data.get('id')
     title_name = data.get('title') or data.get('name') or data.get('title_english')
     
     if is_favorited(item_id, category):
-        st.session_state.favorites[category] = [
-            i for i in st.session_state.favorites[category] 
-            if str(i.get('mal_id') or i.get('id')) != str(item_id)
-        ]
+        st.session_state.favorites.remove(category, item_id)
         st.toast(f"💔 Removed '{title_name}' from Favorites", icon="🗑️")
     else:
         fav_item = {
@@ -133,9 +201,48 @@ def toggle_favorite(data, category='media'):
             'type': data.get('type', 'Unknown'),
             'added_at': datetime.now().strftime("%Y-%m-%d")
         }
-        st.session_state.favorites[category].append(fav_item)
+        st.session_state.favorites.add(category, fav_item)
         st.toast(f"❤️ Added '{title_name}' to Favorites", icon="✅")
 
+# Favorite controls and result cards are fragments: a click reruns only the
+# fragment (the toggle runs as the button callback), not the whole page.
+@st.fragment
+def favorite_button(item, category, key, labels=("💔 Remove", "❤️ Add"), **button_options):
+    in_fav = is_favorited(item.get('mal_id'), category)
+    st.button(labels[0] if in_fav else labels[1], key=key, on_click=toggle_favorite, args=(item, category), **button_options)
+
+@st.fragment
+def media_result_card(item, cover):
+    with st.container(border=True):
+        c1, c2 = st.columns([1, 4])
+        with c1: 
+            if cover: st.image(cover, use_container_width=True)
+            favorite_button(item, 'media', f"fav_btn_{item.get('mal_id')}", labels=("💔", "❤️ Add"), use_container_width=True)
+        
+        with c2:
+            st.subheader(f"📺 {item.get('title_english') or item.get('title')}")
+            synopsis = item.get('synopsis', 'No summary')
+            if synopsis and len(synopsis) > 250:
+                synopsis = synopsis[:250] + "..."
+            st.write(f"**Summary:** {synopsis}")
+            st.markdown(f"[🔗 View on MyAnimeList]({item.get('url', '#')})")
+
+@st.fragment
+def favorite_card(item, category, cover):
+    # A removed card stays in place with an undo button until the next full rerun.
+    with st.container(border=True):
+        if not is_favorited(item['mal_id'], category):
+            st.caption(f"Removed '{item.get('title')}'")
+            st.button("↩️ Undo", key=f"undo_{category}_{item['mal_id']}", on_click=toggle_favorite,
+                      args=(item, category), use_container_width=True)
+            return
+        if cover: st.image(cover, use_container_width=True)
+        st.subheader(item.get('title'))
+        if category == 'media':
+            st.caption(f"Score: {item.get('score', 'N/A')}")
+        st.button("💔 Remove", key=f"rm_{category}_{item['mal_id']}", on_click=toggle_favorite,
+                  args=(item, category), use_container_width=True)
+
 def show_navbar():
     with st.container():
         col1, col2, col3, col4, col5, col6 = st.columns([2.5, 0.8, 0.8, 0.8, 0.8, 0.8], gap="small", vertical_alignment="center")
@@ -166,12 +273,16 @@ def show_navbar():
     col_stats1, col_stats2 = st.columns(2)
     with col_stats1:
         ai_stats = get_api_stats()
-        color = "🔴" if ai_stats['calls_last_minute'] >= 10 else "🟡" if ai_stats['calls_last_minute'] >= 8 else "🟢"
-        st.caption(f"{color} AI: {ai_stats['limit']}")
+        used = ai_stats['calls_last_minute'] / ai_stats['calls_per_minute']
+        color = "🔴" if used >= 1 else "🟡" if used >= 0.8 else "🟢"
+        queued = f" · {ai_stats['queued']} queued" if ai_stats['queued'] else ""
+        st.caption(f"{color} AI: {ai_stats['limit']}{queued}")
     
     with col_stats2:
         jikan_stats = get_jikan_stats()
-        st.caption(f"📊 Jikan: {jikan_stats['total_calls']} calls")
+        hit_ratio = jikan_stats['cache_hit_ratio']
+        cache_note = f" · {hit_ratio:.0%} cached" if hit_ratio is not None else ""
+        st.caption(f"📊 Jikan: {jikan_stats['total_calls']} calls{cache_note}")
     
     st.write("")
 
@@ -292,17 +403,12 @@ def show_homepage():
             col_img, col_info = st.columns([1, 3], gap="large")
             with col_img:
                 img_url = manga.get('images', {}).get('jpg', {}).get('large_image_url')
-                if img_url: st.image(img_url, use_container_width=True)
+                if img_url: st.image(thumbnail_url(img_url, width=DETAIL_WIDTH), use_container_width=True)
                 
                 if st.button("🔄 Shuffle New", on_click=shuffle_manga, use_container_width=True):
                     pass
                 
-                manga_id = manga.get('mal_id')
-                in_fav = is_favorited(manga_id, 'media')
-                btn_label = "💔 Remove" if in_fav else "❤️ Add"
-                if st.button(btn_label, key="daily_fav_btn", use_container_width=True):
-                    toggle_favorite(manga, 'media')
-                    st.rerun()
+                favorite_button(manga, 'media', "daily_fav_btn", use_container_width=True)
 
             with col_info:
                 title = manga.get('title_english') or manga.get('title')
@@ -318,6 +424,7 @@ def show_homepage():
         st.info("💡 This manga will stay the same all day. Come back tomorrow!")
 
 def show_recommend_page():
+    import local_recommender  # numpy; loaded with the first visit to this page
     set_global_style("test1.jpg")
     show_navbar()
     
@@ -341,6 +448,8 @@ def show_recommend_page():
                                 placeholder="E.g. I like coding, cyberpunk themes, complex villains, and cats...",
                                 key="rec_interests")
         
+        instant = st.checkbox("⚡ Show instant picks from the local catalog while the AI thinks", key="rec_instant")
+        
         submit_clicked = st.button("✨ Generate Recommendations", type="primary", use_container_width=True)
         
         if submit_clicked and interests:
@@ -354,40 +463,106 @@ def show_recommend_page():
             }
             st.rerun()
     
+    # Load the local catalog in the background so the fallback is ready when needed.
+    local_recommender.warm_catalog(content_type)
+    
     if st.session_state.ai_recommending:
         params = st.session_state.rec_params
         
-        with st.spinner("🤖 AI is thinking... (this may take 6-10 seconds)"):
-            recs = get_ai_recommendations(
-                params['age'], 
-                params['interests'], 
-                params['mood'], 
-                params['style'], 
-                params['content_type']
-            )
+        # Cards appear one by one as the streamed JSON closes each recommendation.
+        st.markdown("### 🎯 Your Results:")
+        recs = []
+        error = None
+        status = st.empty()
+        wait = estimate_ai_wait(get_quota_session(), PRIORITY_RECOMMEND)
+        status.caption(f"🕒 Gemini is busy, your request is queued (about {wait:.0f}s)..." if wait >= 1 else "🤖 AI is thinking...")
+        preview = st.empty()
+        if instant:
+            picks = local_recommender.recommend(*rec_args(params), timeout=0)
+            if picks:
+                with preview.container():
+                    st.caption("⚡ Quick picks from the local catalog — the AI's answer replaces them as it arrives.")
+                    for idx, item in enumerate(picks):
+                        render_recommendation_card(idx, item)
+        try:
+            for item in stream_ai_recommendations(*rec_args(params), session=get_quota_session()):
+                if not recs:
+                    preview.empty()
+                render_recommendation_card(len(recs), item)
+                recs.append(item)
+        except Exception as e:
+            error = e
+        status.empty()
+        
+        warning = None
+        if error is not None and recs:
+            warning = f"The AI response was cut short; showing the {len(recs)} results received. ({error})"
+        elif not recs:
+            # Gemini failed or returned nothing: answer from the local catalog instead.
+            with st.spinner("AI is unavailable right now, picking from the local catalog..."):
+                recs = local_recommender.recommend(*rec_args(params), timeout=15)
+            if recs:
+                warning = f"The AI is unavailable right now{f' ({error})' if error else ''}; these picks come from the local catalog."
         
         if recs:
             st.session_state.recommendations = recs
+            # Local picks already carry their Jikan payload, so they need no enrichment lookup.
+            st.session_state.rec_enrichment = {idx: item['media'] for idx, item in enumerate(recs) if item.get('media')}
             st.session_state.ai_recommending = False
+            st.session_state.rec_warning = warning
             add_to_history("AI_Recommend", f"{params['content_type']} for {params['mood']} mood", f"Generated {len(recs)} items")
             st.rerun()
         else:
-            st.error("AI could not generate a response. Please try again.")
+            st.error(f"AI could not generate a response. Please try again.{f' ({error})' if error else ''}")
             st.session_state.ai_recommending = False
 
     if st.session_state.recommendations and not st.session_state.ai_recommending:
         st.markdown("### 🎯 Your Results:")
-        for idx, item in enumerate(st.session_state.recommendations):
-            with st.container(border=True):
-                c_a, c_b = st.columns([1, 4])
-                with c_a:
-                    st.markdown(f"## #{idx+1}")
-                with c_b:
-                    st.header(item['title'])
-                    st.caption(f"Genre: {item.get('genre', 'N/A')}")
-                    st.info(item['reason'])
-                    search_url = f"https://myanimelist.net/search/all?q={item['title'].replace(' ', '%20')}"
-                    st.markdown(f"[🔍 Search on Database]({search_url})")
+        if st.session_state.get('rec_warning'):
+            st.warning(st.session_state.rec_warning)
+        recs = st.session_state.recommendations
+        slots = [render_recommendation_card(idx, item) for idx, item in enumerate(recs)]
+
+        # Covers, scores and MAL links fill in card by card as parallel Jikan lookups finish.
+        enriched = st.session_state.rec_enrichment
+        pending = [idx for idx in range(len(recs)) if idx not in enriched]
+        for idx, media in enriched.items():
+            render_enrichment(slots[idx], idx, media)
+        if pending:
+            content_type = st.session_state.rec_params['content_type']
+            titles = [recs[idx]['title'] for idx in pending]
+            for pos, media in enrich_recommendations(titles, content_type):
+                idx = pending[pos]
+                enriched[idx] = media
+                render_enrichment(slots[idx], idx, media)
+
+def rec_args(params):
+    return (params['age'], params['interests'], params['mood'], params['style'], params['content_type'])
+
+def render_recommendation_card(idx, item):
+    with st.container(border=True):
+        c_a, c_b = st.columns([1, 4])
+        with c_a:
+            cover_slot = st.empty()
+            cover_slot.markdown(f"## #{idx+1}")
+        with c_b:
+            st.header(item['title'])
+            st.caption(f"Genre: {item.get('genre', 'N/A')}")
+            st.info(item.get('reason', ''))
+            link_slot = st.empty()
+            search_url = f"https://myanimelist.net/search/all?q={quote(item['title'])}"
+            link_slot.markdown(f"[🔍 Search on Database]({search_url})")
+    return cover_slot, link_slot
+
+def render_enrichment(slots, idx, media):
+    if not media:
+        return
+    cover_slot, link_slot = slots
+    img_url = media.get('images', {}).get('jpg', {}).get('image_url')
+    with cover_slot.container():
+        st.markdown(f"## #{idx+1}")
+        if img_url: st.image(thumbnail_url(img_url), use_container_width=True)
+    link_slot.markdown(f"**⭐ Score:** {media.get('score') or 'N/A'} | [📖 View on MyAnimeList]({media.get('url', '#')})")
 
 def show_genre_page():
     set_global_style("test4.jpg")
@@ -420,12 +595,14 @@ def show_genre_page():
                 st.warning("⚠️ Please choose at least one genre.")
             else:
                 st.session_state.genre_searching = True
+                st.session_state.genre_page = 1
                 st.session_state.genre_params = {
                     'content_type': content_type,
                     'selected_names': selected_names,
                     'order_by': order_by,
                     'genre_map': genre_map
                 }
+                add_to_history("Genre_Search", f"{content_type}: {', '.join(selected_names)}", f"Sort: {order_by}")
                 st.rerun()
     
     if st.session_state.genre_searching:
@@ -440,51 +617,52 @@ def show_genre_page():
         elif params['order_by'] == "Oldest": 
             order_param, sort_param = "start_date", "asc"
         
-        url = f"https://api.jikan.moe/v4/{params['content_type']}?genres={genre_params}&order_by={order_param}&sort={sort_param}&limit=10"
-        add_to_history("Genre_Search", f"{params['content_type']}: {', '.join(params['selected_names'])}", f"Sort: {params['order_by']}")
+        query = {'genres': genre_params, 'order_by': order_param, 'sort': sort_param}
+        page = st.session_state.genre_page
         
         with st.spinner("Fetching data..."):
             try:
-                r = requests.get(url, timeout=15)
-                if r.status_code == 200:
-                    data = r.json().get('data', [])
-                    st.session_state.genre_search_results = data
-                    st.session_state.genre_searching = False
-                    st.rerun()
+                result = get_media_page(params['content_type'], query, page)
+                st.session_state.genre_search_results = result['data']
+                st.session_state.genre_pagination = result['pagination']
+                st.session_state.genre_searching = False
+                st.rerun()
+            except JikanError as e:
+                if e.status:
+                    st.error(f"API Error: {e.status}")
                 else:
-                    st.error(f"API Error: {r.status_code}")
-                    st.session_state.genre_searching = False
-            except Exception as e:
-                st.error(f"Connection Error: {e}")
+                    st.error(f"Connection Error: {e}")
                 st.session_state.genre_searching = False
     
     if st.session_state.genre_search_results and not st.session_state.genre_searching:
         data = st.session_state.genre_search_results
         
         if data:
-            st.success(f"✅ Found {len(data)} results!")
+            pagination = st.session_state.genre_pagination or {}
+            page = st.session_state.genre_page
+            total = pagination.get('items', {}).get('total', len(data))
+            last_page = pagination.get('last_visible_page', page)
+            st.success(f"✅ Found {total} results! Showing page {page} of {last_page}.")
             st.markdown("---")
             
-            for item in data:
-                with st.container(border=True):
-                    c1, c2 = st.columns([1, 4])
-                    with c1: 
-                        st.image(item.get('images', {}).get('jpg', {}).get('image_url'), use_container_width=True)
-                        
-                        manga_id = item.get('mal_id')
-                        in_fav = is_favorited(manga_id, 'media')
-                        btn_label = "💔" if in_fav else "❤️ Add"
-                        if st.button(btn_label, key=f"fav_btn_{manga_id}", use_container_width=True):
-                            toggle_favorite(item, 'media')
-                            st.rerun()
-                    
-                    with c2:
-                        st.subheader(f"📺 {item.get('title_english') or item.get('title')}")
-                        synopsis = item.get('synopsis', 'No summary')
-                        if synopsis and len(synopsis) > 250:
-                            synopsis = synopsis[:250] + "..."
-                        st.write(f"**Summary:** {synopsis}")
-                        st.markdown(f"[🔗 View on MyAnimeList]({item.get('url', '#')})")
+            # All covers of the page are fetched concurrently into the local thumbnail cache.
+            covers = thumbnail_urls([cover_url(item) for item in data])
+            for item, cover in zip(data, covers):
+                media_result_card(item, cover)
+
+            c_prev, c_page, c_next = st.columns([1, 2, 1], vertical_alignment="center")
+            with c_prev:
+                if st.button("⬅️ Previous", disabled=page <= 1, use_container_width=True, key="genre_prev"):
+                    st.session_state.genre_page = page - 1
+                    st.session_state.genre_searching = True
+                    st.rerun()
+            with c_page:
+                st.markdown(f'<p style="text-align:center;">Page {page} / {last_page}</p>', unsafe_allow_html=True)
+            with c_next:
+                if st.button("Next ➡️", disabled=not pagination.get('has_next_page'), use_container_width=True, key="genre_next"):
+                    st.session_state.genre_page = page + 1
+                    st.session_state.genre_searching = True
+                    st.rerun()
         else:
             st.warning("No results found.")
 
@@ -496,41 +674,55 @@ def show_favorites_page():
         show_upgrade_dialog()
     
     st.title("❤️ My Favorites Collection")
+    show_identity_notice()
+    favorites = st.session_state.favorites
     
-    tab1, tab2 = st.tabs(["📚 Animes & Mangas", "🦸 Characters"])
+    tab1, tab2, tab3 = st.tabs(["📚 Animes & Mangas", "🦸 Characters", "💾 Import / Export"])
     
     with tab1:
-        media_list = st.session_state.favorites['media']
+        media_list = favorites.list('media')
         if not media_list:
             st.info("No Animes/Mangas in favorites yet.")
         else:
             st.write(f"Count: {len(media_list)}")
             cols = st.columns(3)
+            covers = thumbnail_urls([item.get('image_url') for item in media_list])
             for i, item in enumerate(media_list):
                 with cols[i % 3]:
-                    with st.container(border=True):
-                        if item.get('image_url'): st.image(item['image_url'], use_container_width=True)
-                        st.subheader(item.get('title'))
-                        st.caption(f"Score: {item.get('score', 'N/A')}")
-                        if st.button("💔 Remove", key=f"rm_media_{item['mal_id']}", use_container_width=True):
-                            toggle_favorite(item, 'media')
-                            st.rerun()
+                    favorite_card(item, 'media', covers[i])
                             
     with tab2:
-        char_list = st.session_state.favorites['characters']
+        char_list = favorites.list('characters')
         if not char_list:
             st.info("No Characters in favorites yet.")
         else:
             st.write(f"Count: {len(char_list)}")
             cols = st.columns(4)
+            covers = thumbnail_urls([item.get('image_url') for item in char_list])
             for i, item in enumerate(char_list):
                 with cols[i % 4]:
-                    with st.container(border=True):
-                        if item.get('image_url'): st.image(item['image_url'], use_container_width=True)
-                        st.subheader(item.get('title'))
-                        if st.button("💔 Remove", key=f"rm_char_{item['mal_id']}", use_container_width=True):
-                            toggle_favorite(item, 'characters')
-                            st.rerun()
+                    favorite_card(item, 'characters', covers[i])
+
+    with tab3:
+        st.caption("🔗 Your favorites are saved on the server and linked to this page's address. Bookmark it to come back to them.")
+        st.download_button(
+            "⬇️ Export favorites (JSON)",
+            favorites.export_json(),
+            file_name="itook_favorites.json",
+            mime="application/json",
+            use_container_width=True
+        )
+        
+        uploaded = st.file_uploader("Import favorites (JSON)", type=["json"], key="fav_import_file")
+        replace = st.checkbox("Replace my current favorites", key="fav_import_replace")
+        if uploaded and st.button("⬆️ Import", type="primary", use_container_width=True):
+            try:
+                count = favorites.import_json(uploaded.getvalue().decode("utf-8"), replace=replace)
+                st.success(f"✅ Imported {count} favorites!")
+            except (ValueError, AttributeError) as e:
+                st.error(f"❌ Invalid favorites file: {e}")
+
+HISTORY_PAGE_SIZE = 20
 
 def show_history_page():
     set_global_style("test1.png") 
@@ -540,20 +732,125 @@ def show_history_page():
         show_upgrade_dialog()
     
     st.title("📜 Activity History")
+    show_identity_notice()
+    
+    history = st.session_state.search_history
     
     if st.button("🗑️ Clear History"):
-        st.session_state.search_history = []
+        history.clear()
+        st.session_state.history_page = 0
         st.rerun()
-        
-    history = st.session_state.search_history
-    if not history:
+    
+    all_counts = history.counts_by_type()
+    if not all_counts:
         st.info("No activity recorded yet.")
-    else:
-        for item in history:
-            with st.expander(f"🕒 {item['timestamp']} - {item['type']}"):
-                st.write(f"**Query:** {item['query']}")
-                if item.get('details'):
-                    st.caption(f"Details: {item['details']}")
+        return
+    
+    c_types, c_dates = st.columns(2)
+    with c_types:
+        types = st.multiselect("🏷️ Action types:", list(all_counts.keys()), key="history_types")
+    with c_dates:
+        date_range = st.date_input("📅 Date range:", value=(), key="history_dates")
+    
+    since = until = None
+    if len(date_range) >= 1:
+        since = datetime.combine(date_range[0], datetime.min.time()).timestamp()
+    if len(date_range) == 2:
+        until = datetime.combine(date_range[1] + timedelta(days=1), datetime.min.time()).timestamp()
+    
+    counts = history.counts_by_type(since, until)
+    metric_cols = st.columns(min(len(counts), 4) or 1)
+    for i, (action_type, n) in enumerate(list(counts.items())[:4]):
+        metric_cols[i].metric(action_type, n)
+    
+    filters = (tuple(types), since, until)
+    if st.session_state.get('history_filters') != filters:
+        st.session_state.history_filters = filters
+        st.session_state.history_page = 0
+    
+    page = st.session_state.get('history_page', 0)
+    total = history.count(types, since, until)
+    last_page = max((total - 1) // HISTORY_PAGE_SIZE, 0)
+    entries = history.query(types, since, until, limit=HISTORY_PAGE_SIZE, offset=page * HISTORY_PAGE_SIZE)
+    
+    if not entries:
+        st.info("No activity matches these filters.")
+    for item in entries:
+        with st.expander(f"🕒 {item['timestamp']} - {item['type']}"):
+            st.write(f"**Query:** {item['query']}")
+            if item.get('details'):
+                st.caption(f"Details: {item['details']}")
+    
+    c_prev, c_page, c_next = st.columns([1, 2, 1], vertical_alignment="center")
+    with c_prev:
+        if st.button("⬅️ Newer", disabled=page <= 0, use_container_width=True, key="history_prev"):
+            st.session_state.history_page = page - 1
+            st.rerun()
+    with c_page:
+        st.markdown(f'<p style="text-align:center;">Page {page + 1} / {last_page + 1} · {total} entries</p>', unsafe_allow_html=True)
+    with c_next:
+        if st.button("Older ➡️", disabled=page >= last_page, use_container_width=True, key="history_next"):
+            st.session_state.history_page = page + 1
+            st.rerun()
+
+def render_ai_stream(placeholder, stream_response):
+    full_text = ""
+    for chunk in stream_response:
+        if isinstance(chunk, QueueChunk):
+            notice = f"🕒 Waiting for a Gemini slot: {chunk.position} request(s) ahead, about {chunk.wait:.0f}s..."
+            if full_text:
+                placeholder.success(f"{full_text}\n\n{notice}", icon="📝")
+            else:
+                placeholder.info(notice)
+        elif isinstance(chunk, RetryChunk):
+            notice = f"⏳ Gemini is busy, retrying in {chunk.delay:.0f}s (attempt {chunk.attempt})..."
+            if full_text:
+                placeholder.success(f"{full_text}\n\n{notice}", icon="📝")
+            else:
+                placeholder.warning(notice)
+        elif isinstance(chunk, ErrorChunk):
+            placeholder.error(f"❌ {chunk.text}")
+            return full_text, chunk.text
+        elif hasattr(chunk, 'text'):
+            full_text += chunk.text
+            placeholder.success(full_text + "▌", icon="📝")
+    placeholder.success(full_text, icon="📝")
+    return full_text, None
+
+def render_vision_batch():
+    types = ["jpg", "png", "jpeg", "gif", "webp"] + (list(VIDEO_TYPES) if video_supported() else [])
+    uploads = st.file_uploader(
+        "Upload screenshots or clips",
+        type=types,
+        accept_multiple_files=True,
+        key="vision_batch_uploader"
+    )
+    if not video_supported():
+        st.caption("🎞️ Animated GIF/WebP clips work; video files are not enabled on this server.")
+
+    if uploads and st.button(f"🚀 Identify all ({len(uploads)})", key="btn_scan_vision_batch", type="primary"):
+        wait = estimate_ai_wait(get_quota_session(), PRIORITY_VISION)
+        queued = f" (queued, about {wait:.0f}s)" if wait >= 1 else ""
+        try:
+            with st.spinner(f"🤖 Extracting frames and asking Gemini Vision...{queued}"):
+                results = ai_vision_batch(uploads, session=get_quota_session())
+            st.session_state.vision_batch_results = results
+            found = [r['characters'][0]['name'] for r in results if r['characters']]
+            add_to_history("Wiki_Vision", f"{len(uploads)} uploads", f"Detected: {', '.join(dict.fromkeys(found)) or 'nothing'}")
+        except QuotaBusy as e:
+            st.warning(f"⏳ Gemini is busy for everyone right now (about {e.wait:.0f}s of queued requests). Please try again shortly.")
+
+    for result in st.session_state.vision_batch_results or []:
+        with st.container(border=True):
+            st.markdown(f"**{result['input']}** · {result['frames']} frame(s)")
+            if result['error']:
+                st.error(f"❌ {result['error']}")
+            elif not result['characters']:
+                st.info("No character identified. Try clearer frames or use text search.")
+            for rank, character in enumerate(result['characters'][:5], 1):
+                search_url = f"https://myanimelist.net/character.php?q={quote(character['name'])}"
+                st.markdown(f"{rank}. **{character['name']}** — {character['score']:.0%} "
+                            f"({character['frames']}/{result['frames']} frames) · [MAL]({search_url})")
 
 def show_wiki_page():
     set_global_style("test3.jpg")
@@ -566,9 +863,9 @@ def show_wiki_page():
     st.title("🕵️ Character Wiki & Vision")
     
     stats = get_api_stats()
-    if stats['calls_last_minute'] >= 10:
-        st.warning(f"⚠️ API Usage: {stats['limit']} - Approaching limit!")
-    elif stats['calls_last_minute'] >= 8:
+    if stats['calls_last_minute'] >= stats['calls_per_minute']:
+        st.warning(f"⚠️ API Usage: {stats['limit']} - Approaching limit! New requests are queued.")
+    elif stats['calls_last_minute'] >= 0.8 * stats['calls_per_minute']:
         st.info(f"ℹ️ API Usage: {stats['limit']}")
     
     if 'wiki_search_results' not in st.session_state: 
@@ -581,6 +878,8 @@ def show_wiki_page():
         st.session_state.search_source = None
     if 'analyzing' not in st.session_state:
         st.session_state.analyzing = False
+    if 'vision_batch_results' not in st.session_state:
+        st.session_state.vision_batch_results = None
 
     def clear_previous_results():
         st.session_state.wiki_search_results = None
@@ -594,26 +893,15 @@ def show_wiki_page():
         c_img, c_info = st.columns([1, 2])
         
         with c_img: 
-            st.image(info['images']['jpg']['image_url'], use_container_width=True)
+            st.image(thumbnail_url(cover_url(info), width=DETAIL_WIDTH), use_container_width=True)
             
-            char_id = info['mal_id']
-            in_fav = is_favorited(char_id, 'characters')
-            btn_label = "💔 Unfavorite" if in_fav else "❤️ Favorite"
-            
-            if st.button(btn_label, key=f"wiki_fav_{char_id}"):
-                toggle_favorite(info, 'characters')
-                st.rerun()
+            favorite_button(info, 'characters', f"wiki_fav_{info['mal_id']}", labels=("💔 Unfavorite", "❤️ Favorite"))
                 
         with c_info:
             st.header(info['name'])
             st.subheader(f"Japanese: {info.get('name_kanji', '')}")
             
-            char_id = info.get('mal_id')
-            about = info.get('about', 'N/A')
-            about_preview = about[:200] if about and about != 'N/A' else "no_data"
-            cache_key = f"{char_id}_{hash(about_preview)}"
-            
-            if cache_key in st.session_state.get('character_analysis_cache', {}):
+            if is_profile_cached(info):
                 st.success("⚡ Loaded from cache (instant!)", icon="⚡")
             
             st.success(ai_text, icon="📝")
@@ -646,193 +934,213 @@ def show_wiki_page():
                     key="char_select_box"
                 )
                 
-                selected_info = char_opts<function_calls>
-<invoke name="artifacts">
-<parameter name="command">update</parameter>
-<parameter name="id">main_complete_fixed</parameter>
-<parameter name="old_str">                selected_info = char_opts</parameter>
-<parameter name="new_str">                selected_info = char_opts[selected_key]
-            st.info("💡 Tip: Analysis results are cached. Re-analyzing the same character is instant!")
+                selected_info = char_opts[selected_key]
+                st.info("💡 Tip: Analysis results are cached. Re-analyzing the same character is instant!")
+
+                # One AI request covers several characters, so preparing every result costs a fraction of the quota.
+                uncached = [c for c in results if not is_profile_cached(c)]
+                if len(uncached) > 1:
+                    calls = profile_batches(len(uncached))
+                    if st.button(f"⚡ Prepare all {len(uncached)} profiles ({calls} AI request{'s' if calls > 1 else ''} instead of {len(uncached)})",
+                                 use_container_width=True, key="analyze_all_btn"):
+                        progress = st.progress(0.0, text="🤖 AI is writing the profiles...")
+                        done = 0
+                        error = None
+                        try:
+                            for info, _ in generate_profiles(uncached, session=get_quota_session()):
+                                done += 1
+                                progress.progress(done / len(uncached), text=f"✅ {done}/{len(uncached)}: {info['name']}")
+                        except QuotaBusy as e:
+                            error = f"⏳ Gemini is busy for everyone right now (about {e.wait:.0f}s of queued requests). Please try again shortly."
+                        except Exception as e:
+                            error = f"Prepared {done} of {len(uncached)} profiles. ({e})"
+                        if done:
+                            add_to_history("Wiki_Analysis", f"{done} characters", "AI Profiles Generated (batch)")
+                        if error:
+                            st.warning(error)
+                        elif done:
+                            st.rerun()
             
-            analyze_clicked = st.button(
-                "🚀 Analyze Profile", 
-                type="primary", 
-                use_container_width=True,
-                key="analyze_btn"
-            )
+                analyze_clicked = st.button(
+                    "🚀 Analyze Profile", 
+                    type="primary", 
+                    use_container_width=True,
+                    key="analyze_btn"
+                )
             
-            if analyze_clicked:
-                st.session_state.wiki_selected_char = selected_info
-                st.session_state.analyzing = True
-                st.rerun()
+                if analyze_clicked:
+                    st.session_state.wiki_selected_char = selected_info
+                    st.session_state.analyzing = True
+                    st.rerun()
             
-            if (st.session_state.wiki_selected_char and 
-                st.session_state.wiki_selected_char['mal_id'] == selected_info['mal_id']):
+                if (st.session_state.wiki_selected_char and 
+                    st.session_state.wiki_selected_char['mal_id'] == selected_info['mal_id']):
                 
-                if st.session_state.analyzing:
-                    st.markdown("---")
-                    c1, c2 = st.columns([1, 2])
+                    if st.session_state.analyzing:
+                        st.markdown("---")
+                        c1, c2 = st.columns([1, 2])
                     
-                    with c1: 
-                        st.image(selected_info['images']['jpg']['image_url'], use_container_width=True)
+                        with c1: 
+                            st.image(thumbnail_url(cover_url(selected_info), width=DETAIL_WIDTH), use_container_width=True)
                     
-                    with c2:
-                        st.header(selected_info['name'])
+                        with c2:
+                            st.header(selected_info['name'])
                         
-                        char_id = selected_info.get('mal_id')
-                        about = selected_info.get('about', 'N/A')
-                        about_preview = about[:200] if about and about != 'N/A' else "no_data"
-                        cache_key = f"{char_id}_{hash(about_preview)}"
-                        
-                        if cache_key in st.session_state.get('character_analysis_cache', {}):
-                            st.success("⚡ Loading from cache...")
-                            cached_text = st.session_state.character_analysis_cache[cache_key]
-                            st.success(cached_text, icon="📝")
-                            st.session_state.wiki_ai_analysis = cached_text
-                            st.session_state.analyzing = False
-                        else:
+                            if is_profile_cached(selected_info):
+                                st.success("⚡ Loading from cache...")
                             placeholder = st.empty()
                             placeholder.info("🤖 AI is analyzing... (6-10 seconds)")
-                            
-                            full_text = ""
+                        
                             try:
-                                stream_response = generate_ai_stream(selected_info)
-                                
-                                for chunk in stream_response:
-                                    if hasattr(chunk, 'text'):
-                                        full_text += chunk.text
-                                        placeholder.success(full_text + "▌", icon="📝")
-                                
-                                placeholder.success(full_text, icon="📝")
-                                st.session_state.wiki_ai_analysis = full_text
+                                stream_response = generate_ai_stream(selected_info, session=get_quota_session())
+                                full_text, error = render_ai_stream(placeholder, stream_response)
+                            
+                                if not error:
+                                    st.session_state.wiki_ai_analysis = full_text
+                                    add_to_history("Wiki_Analysis", selected_info['name'], "AI Profile Generated")
                                 st.session_state.analyzing = False
-                                add_to_history("Wiki_Analysis", selected_info['name'], "AI Profile Generated")
-                                
+                            
                             except Exception as e:
                                 placeholder.error(f"❌ Error: {e}")
                                 st.session_state.analyzing = False
                 
-                elif st.session_state.wiki_ai_analysis:
-                    display_character_profile(selected_info, st.session_state.wiki_ai_analysis)
-        else:
-            st.warning("No character found.")
+                    elif st.session_state.wiki_ai_analysis:
+                        display_character_profile(selected_info, st.session_state.wiki_ai_analysis)
+            else:
+                st.warning("No character found.")
 
-with tab2:
-    st.info("📸 Upload an anime screenshot to identify the character.")
-    st.warning("⚠️ Vision detection uses more API quota. Use sparingly!")
+    with tab2:
+        st.info("📸 Upload an anime screenshot to identify the character.")
+        st.warning("⚠️ Vision detection uses more API quota. Use sparingly!")
     
-    uploaded = st.file_uploader(
-        "Upload Image", 
-        type=["jpg", "png", "jpeg"], 
-        key="vision_uploader"
-    )
+        if st.toggle("Batch mode: several screenshots or clips at once", key="vision_batch_mode"):
+            render_vision_batch()
+        else:
+            uploaded = st.file_uploader(
+                "Upload Image", 
+                type=["jpg", "png", "jpeg"], 
+                key="vision_uploader"
+            )
     
-    if uploaded:
-        st.image(uploaded, width=150, caption="Preview")
-        st.info("💡 This will use AI vision (8-10 seconds wait time)")
+            if uploaded:
+                st.image(uploaded, width=150, caption="Preview")
+                st.info("💡 This will use AI vision (8-10 seconds wait time)")
         
-        scan_clicked = st.button(
-            "🚀 Scan Character", 
-            key="btn_scan_vision", 
-            type="primary"
-        )
+                scan_clicked = st.button(
+                    "🚀 Scan Character", 
+                    key="btn_scan_vision", 
+                    type="primary"
+                )
         
-        if scan_clicked:
-            clear_previous_results()
-            st.session_state.search_source = "image"
-            st.session_state.analyzing = True
-            st.rerun()
+                if scan_clicked:
+                    clear_previous_results()
+                    st.session_state.search_source = "image"
+                    st.session_state.analyzing = True
+                    st.rerun()
     
-    if (st.session_state.search_source == "image" and 
-        st.session_state.analyzing and 
-        uploaded):
+            if (st.session_state.search_source == "image" and 
+                st.session_state.analyzing and 
+                uploaded):
         
-        with st.spinner("🤖 Gemini Vision is analyzing..."):
-            name = ai_vision_detect(uploaded)
-            add_to_history("Wiki_Vision", "Image Upload", f"Detected: {name}")
+                wait = estimate_ai_wait(get_quota_session(), PRIORITY_VISION)
+                queued = f" (queued, about {wait:.0f}s)" if wait >= 1 else ""
+                try:
+                    with st.spinner(f"🤖 Gemini Vision is analyzing...{queued}"):
+                        name = ai_vision_detect(uploaded, session=get_quota_session())
+                        add_to_history("Wiki_Vision", "Image Upload", f"Detected: {name}")
+                except QuotaBusy as e:
+                    st.warning(f"⏳ Gemini is busy for everyone right now (about {e.wait:.0f}s of queued requests). Please try again shortly.")
+                    st.session_state.analyzing = False
+                    name = None
         
-        if name != "Unknown":
-            st.success(f"✅ Detected: **{name}**")
-            info = get_one_character_data(name)
+                if name and name != "Unknown":
+                    st.success(f"✅ Detected: **{name}**")
+                    info = get_one_character_data(name)
             
-            if info:
-                st.session_state.wiki_selected_char = info
+                    if info:
+                        st.session_state.wiki_selected_char = info
                 
-                st.markdown("---")
-                c1, c2 = st.columns([1, 2])
+                        st.markdown("---")
+                        c1, c2 = st.columns([1, 2])
                 
-                with c1: 
-                    st.image(info['images']['jpg']['image_url'], use_container_width=True)
+                        with c1: 
+                            st.image(thumbnail_url(cover_url(info), width=DETAIL_WIDTH), use_container_width=True)
                 
-                with c2:
-                    st.header(info['name'])
+                        with c2:
+                            st.header(info['name'])
                     
-                    placeholder = st.empty()
-                    full_text = ""
+                            placeholder = st.empty()
+                            placeholder.info("🤖 Generating profile...")
                     
-                    try:
-                        with st.spinner("Generating profile..."):
-                            stream_response = generate_ai_stream(info)
-                            
-                        for chunk in stream_response:
-                            if hasattr(chunk, 'text'):
-                                full_text += chunk.text
-                                placeholder.success(full_text + "▌", icon="📝")
+                            try:
+                                stream_response = generate_ai_stream(info, session=get_quota_session())
+                                full_text, error = render_ai_stream(placeholder, stream_response)
                         
-                        placeholder.success(full_text, icon="📝")
-                        st.session_state.wiki_ai_analysis = full_text
-                        st.session_state.analyzing = False
+                                if not error:
+                                    st.session_state.wiki_ai_analysis = full_text
+                                st.session_state.analyzing = False
                         
-                    except Exception as e:
-                        placeholder.error(f"❌ Error: {e}")
+                            except Exception as e:
+                                placeholder.error(f"❌ Error: {e}")
+                                st.session_state.analyzing = False
+                    else:
+                        st.warning(f"Found '{name}' but no info on MyAnimeList.")
                         st.session_state.analyzing = False
-            else:
-                st.warning(f"Found '{name}' but no info on MyAnimeList.")
-                st.session_state.analyzing = False
-        else:
-            st.error("❌ Cannot identify character. Try a clearer image or use text search.")
-            st.session_state.analyzing = False
-    
-    elif (st.session_state.search_source == "image" and 
-          st.session_state.wiki_ai_analysis and 
-          st.session_state.wiki_selected_char):
-        display_character_profile(
-            st.session_state.wiki_selected_char, 
-            st.session_state.wiki_ai_analysis
-        )
+                elif name is not None:
+                    st.error("❌ Cannot identify character. Try a clearer image or use text search.")
+                    st.session_state.analyzing = False
+    
+            elif (st.session_state.search_source == "image" and 
+                  st.session_state.wiki_ai_analysis and 
+                  st.session_state.wiki_selected_char):
+                display_character_profile(
+                    st.session_state.wiki_selected_char, 
+                    st.session_state.wiki_ai_analysis
+                )
 
-st.markdown("---")
-with st.expander("🗂️ Cache Management"):
-    if 'character_analysis_cache' in st.session_state:
-        cache_size = len(st.session_state.character_analysis_cache)
-        st.caption(f"📊 Cached analyses: {cache_size}")
-        
+    st.markdown("---")
+    with st.expander("🗂️ Cache Management"):
+        cache_size = get_analysis_cache_size()
         if cache_size > 0:
-            if st.button("🗑️ Clear All Cache"):
+            st.caption(f"📊 Cached analyses (shared by all users): {cache_size}")
+        else:
+            st.caption("📊 No cached data yet")
+
+        # Clearing drops every visitor's profiles and costs quota to rebuild them,
+        # and the metrics describe the whole service: both are for operators.
+        if admin_unlocked():
+            if cache_size > 0 and st.button("🗑️ Clear All Cache"):
                 clear_analysis_cache()
                 st.success("Cache cleared!")
                 st.rerun()
-    else:
-        st.caption("📊 No cached data yet")
+
+            # Exports are built when clicked, not on every rerun.
+            c_json, c_prom = st.columns(2)
+            with c_json:
+                st.download_button("📈 Metrics (JSON)", export_json, file_name="itook_metrics.json", mime="application/json", use_container_width=True)
+            with c_prom:
+                st.download_button("📈 Metrics (Prometheus)", export_prometheus, file_name="itook_metrics.prom", mime="text/plain", use_container_width=True)
+
 def show_contact_page():
-set_global_style("https://images.unsplash.com/photo-1534528741775-53994a69daeb?q=80&w=1964&auto=format&fit=crop")
-show_navbar()
-if st.session_state.show_upgrade_modal:
-    show_upgrade_dialog()
-    return
+    set_global_style("https://images.unsplash.com/photo-1534528741775-53994a69daeb?q=80&w=1964&auto=format&fit=crop")
+    show_navbar()
+    if st.session_state.show_upgrade_modal:
+        show_upgrade_dialog()
+        return
+
+    st.markdown('<div class="content-box"><h2>📞 Contact Us</h2><p>Email: admin@itooklibrary.com</p></div>', unsafe_allow_html=True)
 
-st.markdown('<div class="content-box"><h2>📞 Contact Us</h2><p>Email: admin@itooklibrary.com</p></div>', unsafe_allow_html=True)
 if st.session_state.current_page == 'home':
-show_homepage()
+    show_homepage()
 elif st.session_state.current_page == 'wiki':
-show_wiki_page()
+    show_wiki_page()
 elif st.session_state.current_page == 'genre':
-show_genre_page()
+    show_genre_page()
 elif st.session_state.current_page == 'recommend':
-show_recommend_page()
+    show_recommend_page()
 elif st.session_state.current_page == 'favorites':
-show_favorites_page()
+    show_favorites_page()
 elif st.session_state.current_page == 'history':
-show_history_page()
+    show_history_page()
 elif st.session_state.current_page == 'contact':
-show_contact_page()</parameter>
+    show_contact_page()
@@ -0,0 +1,210 @@
+import bisect
+import json
+import threading
+import time
+
+# # Process-wide instrumentation
+# Counters, sliding windows and latency histograms shared by every session.
+# All structures are fixed-size, so updates and reads cost O(1) regardless of
+# traffic, and one lock keeps them consistent across Streamlit threads.
+
+WINDOW_SECONDS = 60
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class SlidingWindow:
+    # Events in the last `size` seconds, in one-second buckets with a running total.
+    def __init__(self, size=WINDOW_SECONDS):
+        self.size = size
+        self.buckets = [0] * size
+        self.total = 0
+        self.head = int(time.time())
+
+    def _advance(self, now):
+        second = int(now)
+        steps = min(second - self.head, self.size)
+        for i in range(1, steps + 1):
+            slot = (self.head + i) % self.size
+            self.total -= self.buckets[slot]
+            self.buckets[slot] = 0
+        if second > self.head:
+            self.head = second
+
+    def add(self, now, n=1):
+        self._advance(now)
+        self.buckets[self.head % self.size] += n
+        self.total += n
+
+    def count(self, now):
+        self._advance(now)
+        return self.total
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th observation (Prometheus-style estimate).
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+
+class EndpointStats:
+    def __init__(self):
+        self.total = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.window = SlidingWindow()
+        self.latency = Histogram()
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}   # (service, endpoint) -> EndpointStats
+        self.caches = {}      # name -> [hits, misses]
+        self.tokens = {"prompt": 0, "completion": 0}
+
+    def _endpoint(self, service, endpoint):
+        stats = self.endpoints.get((service, endpoint))
+        if stats is None:
+            stats = self.endpoints[(service, endpoint)] = EndpointStats()
+        return stats
+
+    def record_call(self, service, endpoint, latency_s, status=200):
+        now = time.time()
+        with self.lock:
+            stats = self._endpoint(service, endpoint)
+            stats.total += 1
+            stats.window.add(now)
+            stats.latency.observe(latency_s * 1000)
+            if status == 429:
+                stats.rate_limited += 1
+            if status != 200:
+                stats.errors += 1
+
+    def record_cache(self, name, hit):
+        with self.lock:
+            counts = self.caches.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def record_tokens(self, prompt=0, completion=0):
+        with self.lock:
+            self.tokens["prompt"] += prompt or 0
+            self.tokens["completion"] += completion or 0
+
+    def service_summary(self, service):
+        now = time.time()
+        with self.lock:
+            summary = {"total_calls": 0, "calls_last_minute": 0, "errors": 0, "rate_limited": 0}
+            for (svc, _), stats in self.endpoints.items():
+                if svc != service:
+                    continue
+                summary["total_calls"] += stats.total
+                summary["calls_last_minute"] += stats.window.count(now)
+                summary["errors"] += stats.errors
+                summary["rate_limited"] += stats.rate_limited
+            return summary
+
+    def cache_hit_ratio(self, name):
+        with self.lock:
+            hits, misses = self.caches.get(name, (0, 0))
+        return hits / (hits + misses) if hits + misses else None
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            endpoints = []
+            for (service, endpoint), stats in sorted(self.endpoints.items()):
+                endpoints.append({
+                    "service": service,
+                    "endpoint": endpoint,
+                    "total": stats.total,
+                    "last_minute": stats.window.count(now),
+                    "errors": stats.errors,
+                    "rate_limited": stats.rate_limited,
+                    "latency_ms": {
+                        "count": stats.latency.count,
+                        "sum": stats.latency.sum,
+                        "p50": stats.latency.percentile(0.50),
+                        "p95": stats.latency.percentile(0.95),
+                        "p99": stats.latency.percentile(0.99),
+                        "buckets": list(zip(stats.latency.bounds + ("+Inf",), stats.latency.counts)),
+                    },
+                })
+            caches = {
+                name: {"hits": hits, "misses": misses, "hit_ratio": hits / (hits + misses) if hits + misses else None}
+                for name, (hits, misses) in sorted(self.caches.items())
+            }
+            return {"timestamp": now, "endpoints": endpoints, "caches": caches, "gemini_tokens": dict(self.tokens)}
+
+
+metrics = Metrics()
+
+
+def export_json():
+    return json.dumps(_finite(metrics.snapshot()), indent=2)
+
+
+def _finite(value):
+    # JSON has no Infinity; the overflow bucket is reported as "+Inf" like Prometheus.
+    if isinstance(value, float) and value == float("inf"):
+        return "+Inf"
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def export_prometheus():
+    snap = metrics.snapshot()
+    lines = []
+
+    def family(name, kind, samples):
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+
+    endpoints = [(f'service="{ep["service"]}",endpoint="{ep["endpoint"]}"', ep) for ep in snap["endpoints"]]
+    family("itook_requests_total", "counter", [f"itook_requests_total{{{l}}} {ep['total']}" for l, ep in endpoints])
+    family("itook_requests_last_minute", "gauge",
+           [f"itook_requests_last_minute{{{l}}} {ep['last_minute']}" for l, ep in endpoints])
+    family("itook_request_errors_total", "counter",
+           [f"itook_request_errors_total{{{l}}} {ep['errors']}" for l, ep in endpoints])
+    family("itook_rate_limited_total", "counter",
+           [f"itook_rate_limited_total{{{l}}} {ep['rate_limited']}" for l, ep in endpoints])
+
+    histogram = []
+    for l, ep in endpoints:
+        cumulative = 0
+        for bound, n in ep["latency_ms"]["buckets"]:
+            cumulative += n
+            histogram.append(f'itook_request_latency_ms_bucket{{{l},le="{bound}"}} {cumulative}')
+        histogram.append(f"itook_request_latency_ms_sum{{{l}}} {ep['latency_ms']['sum']:.3f}")
+        histogram.append(f"itook_request_latency_ms_count{{{l}}} {ep['latency_ms']['count']}")
+    family("itook_request_latency_ms", "histogram", histogram)
+
+    cache_samples = []
+    for name, cache in snap["caches"].items():
+        cache_samples.append(f'itook_cache_requests_total{{cache="{name}",result="hit"}} {cache["hits"]}')
+        cache_samples.append(f'itook_cache_requests_total{{cache="{name}",result="miss"}} {cache["misses"]}')
+    family("itook_cache_requests_total", "counter", cache_samples)
+    family("itook_gemini_tokens_total", "counter",
+           [f'itook_gemini_tokens_total{{kind="{kind}"}} {n}' for kind, n in snap["gemini_tokens"].items()])
+    return "\n".join(lines) + "\n"
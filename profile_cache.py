@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import time
+
+from metrics import metrics
+import storage
+
+# # AI character-profile cache
+# Server-side and shared by every visitor: one Gemini call per character per
+# server instead of one per session. Keys are a SHA-256 digest of the character
+# id, its bio and the prompt version, so they are stable across restarts.
+# Size-bounded with least-recently-used eviction.
+
+DB_NAME = "profile_cache.sqlite3"
+PROMPT_VERSION = "1"
+MAX_ENTRIES = 5000
+MAX_BYTES = 20 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    key TEXT PRIMARY KEY,
+    mal_id INTEGER,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS profiles_last_access ON profiles (last_access)"
+
+_evict_lock = threading.Lock()
+
+
+def _db():
+    return storage.connect(DB_NAME, [_SCHEMA, _INDEX])
+
+
+def profile_key(info):
+    about = info.get('about') or ""
+    payload = f"{PROMPT_VERSION}\n{info.get('mal_id')}\n{about}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(info):
+    key = profile_key(info)
+    conn = _db()
+    row = conn.execute("SELECT text FROM profiles WHERE key = ?", (key,)).fetchone()
+    metrics.record_cache("profile", row is not None)
+    if row is None:
+        return None
+    conn.execute("UPDATE profiles SET last_access = ? WHERE key = ?", (time.time(), key))
+    return row[0]
+
+
+def contains(info):
+    row = _db().execute("SELECT 1 FROM profiles WHERE key = ?", (profile_key(info),)).fetchone()
+    return row is not None
+
+
+def put(info, text):
+    now = time.time()
+    size = len(text.encode("utf-8"))
+    conn = _db()
+    conn.execute(
+        "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?)",
+        (profile_key(info), info.get('mal_id'), text, size, now, now),
+    )
+    _evict(conn)
+
+
+def _evict(conn):
+    with _evict_lock:
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM profiles").fetchone()
+        if count <= MAX_ENTRIES and total <= MAX_BYTES:
+            return
+        rows = conn.execute("SELECT key, size FROM profiles ORDER BY last_access").fetchall()
+        doomed = []
+        for key, size in rows:
+            if count <= MAX_ENTRIES and total <= MAX_BYTES:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM profiles WHERE key = ?", doomed)
+
+
+def size():
+    return _db().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+
+def clear():
+    _db().execute("DELETE FROM profiles")
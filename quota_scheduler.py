@@ -0,0 +1,146 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+
+from rate_limit import TokenBucket
+
+# # Shared quota scheduler
+# One queue in front of a calls-per-minute quota for the whole process.
+# Requests carry a priority class (lower number = served first) and a session
+# id. Classes are served strictly in order; inside a class sessions take turns
+# (round robin), so one session queueing many requests only delays itself.
+# Every waiter can ask for its position and an estimated wait, and requests
+# whose estimate is over a caller-given limit are refused up front (QuotaBusy)
+# rather than queued.
+
+
+class QuotaBusy(Exception):
+    def __init__(self, wait, reason=None):
+        super().__init__(reason or f"quota busy, estimated wait {wait:.0f}s")
+        self.wait = wait
+
+
+class Ticket:
+    def __init__(self, scheduler, session, priority):
+        self.scheduler = scheduler
+        self.session = session
+        self.priority = priority
+        self.granted = False
+
+    def wait(self, timeout=None):
+        # True once the call may go out; False if `timeout` passed first (still queued).
+        return self.scheduler._wait(self, timeout)
+
+    def estimate(self):
+        # (requests served before this one, estimated seconds until it goes out)
+        return self.scheduler._estimate(self)
+
+    def cancel(self):
+        self.scheduler._cancel(self)
+
+
+class QuotaScheduler:
+    def __init__(self, calls_per_minute, burst=1, priorities=4):
+        self._cond = threading.Condition()
+        self._queues = [OrderedDict() for _ in range(priorities)]  # per class: session -> deque of tickets
+        self.paused_until = 0.0
+        self.configure(calls_per_minute, burst)
+
+    def configure(self, calls_per_minute, burst=1):
+        with self._cond:
+            self.calls_per_minute = calls_per_minute
+            self._bucket = TokenBucket(calls_per_minute / 60.0, burst)
+            self._cond.notify_all()
+
+    def submit(self, session, priority, max_wait=None, max_pending=None):
+        # Queues a request; raises QuotaBusy instead when it would wait longer than
+        # `max_wait` seconds or the session already has `max_pending` queued.
+        with self._cond:
+            ticket = Ticket(self, session, priority)
+            if max_pending is not None and self._pending_for(session) >= max_pending:
+                raise QuotaBusy(self._estimate(ticket, phantom=True)[1],
+                                f"{max_pending} requests of this session are already waiting")
+            if max_wait is not None:
+                wait = self._estimate(ticket, phantom=True)[1]
+                if wait > max_wait:
+                    raise QuotaBusy(wait)
+            self._queues[priority].setdefault(session, deque()).append(ticket)
+            return ticket
+
+    def estimate_wait(self, session, priority):
+        # What a request submitted now would wait, for showing before submitting.
+        with self._cond:
+            return self._estimate(Ticket(self, session, priority), phantom=True)[1]
+
+    def pending(self):
+        with self._cond:
+            return sum(len(lane) for sessions in self._queues for lane in sessions.values())
+
+    def pause(self, seconds):
+        # The server said "quota exceeded": hold every queued request, not only the caller's retry.
+        with self._cond:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self._bucket.drain(now)
+
+    def _pending_for(self, session):
+        return sum(len(sessions.get(session, ())) for sessions in self._queues)
+
+    def _dispatch_order(self, extra=None):
+        # The order queued tickets will be granted in if nothing else arrives.
+        order = []
+        for priority, sessions in enumerate(self._queues):
+            lanes = OrderedDict((session, list(lane)) for session, lane in sessions.items())
+            if extra is not None and extra.priority == priority:
+                lanes.setdefault(extra.session, []).append(extra)
+            for turn in itertools.zip_longest(*lanes.values()):
+                order.extend(ticket for ticket in turn if ticket is not None)
+        return order
+
+    def _estimate(self, ticket, phantom=False):
+        order = self._dispatch_order(extra=ticket if phantom else None)
+        position = next((i for i, t in enumerate(order) if t is ticket), len(order))
+        now = time.monotonic()
+        self._bucket.wait_time(now)  # refills
+        missing = position + 1 - self._bucket.tokens
+        wait = max(self.paused_until - now, missing / self._bucket.rate if missing > 0 else 0.0)
+        return position, wait
+
+    def _wait(self, ticket, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not ticket.granted:
+                now = time.monotonic()
+                delay = None
+                if self._dispatch_order()[:1] == [ticket]:
+                    delay = max(self.paused_until - now, self._bucket.wait_time(now))
+                    if delay <= 0:
+                        self._bucket.take()
+                        self._remove(ticket, granted=True)
+                        ticket.granted = True
+                        self._cond.notify_all()
+                        break
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    delay = deadline - now if delay is None else min(delay, deadline - now)
+                self._cond.wait(delay)
+            return True
+
+    def _cancel(self, ticket):
+        with self._cond:
+            if not ticket.granted:
+                self._remove(ticket)
+                self._cond.notify_all()
+
+    def _remove(self, ticket, granted=False):
+        sessions = self._queues[ticket.priority]
+        lane = sessions.get(ticket.session)
+        if lane is None or ticket not in lane:
+            return
+        lane.remove(ticket)
+        if not lane:
+            del sessions[ticket.session]
+        elif granted:
+            sessions.move_to_end(ticket.session)  # next turn goes to the other sessions
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    # Classic token bucket: `capacity` tokens, refilled at `rate` tokens/second.
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self, now):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class SlidingWindow:
+    # At most `limit` calls in any `period` seconds, kept as a log of call times.
+    # Unlike a bucket of the same size it never lets 2x `limit` through at the
+    # start of a period.
+    def __init__(self, limit, period):
+        self.limit = int(limit)
+        self.period = float(period)
+        self.calls = deque()
+
+    def _expire(self, now):
+        while self.calls and self.calls[0] <= now - self.period:
+            self.calls.popleft()
+
+    def wait_time(self, now):
+        self._expire(now)
+        if len(self.calls) < self.limit:
+            return 0.0
+        return self.calls[0] + self.period - now
+
+    def take(self):
+        self.calls.append(time.monotonic())
+
+    def drain(self, now):
+        # Nothing to reset: the log already counts every recent call.
+        self._expire(now)
+
+
+class RateLimiter:
+    # Several limits acquired together, e.g. 3 req/s AND 60 req/min: `limits`
+    # are token buckets as (tokens/second, burst), `windows` are sliding
+    # windows as (calls, seconds).
+    # Thread-safe, so one instance can be shared by every Streamlit session.
+    def __init__(self, limits, windows=()):
+        self.buckets = [TokenBucket(rate, capacity) for rate, capacity in limits]
+        self.buckets += [SlidingWindow(limit, period) for limit, period in windows]
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+
+    def _wait_time(self, now):
+        wait = max(self.paused_until - now, 0.0)
+        for bucket in self.buckets:
+            wait = max(wait, bucket.wait_time(now))
+        return wait
+
+    def estimate_wait(self):
+        with self.lock:
+            return self._wait_time(time.monotonic())
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self._wait_time(now)
+                if wait <= 0:
+                    for bucket in self.buckets:
+                        bucket.take()
+                    return True
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def pause(self, seconds):
+        # Server told us to back off (429 / Retry-After): stop everyone, not just the caller.
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            for bucket in self.buckets:
+                bucket.drain(now)
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import threading
+
+# # Local persistent storage
+# All on-disk state (caches, indexes, user data) lives in one directory so that
+# restarts and extra workers on the same host start warm.
+
+DATA_DIR = os.environ.get("ITOOK_DATA_DIR", os.path.join(os.getcwd(), ".itook_cache"))
+
+MAX_IDLE_CONNECTIONS = 4   # per database, kept for the next thread
+
+_local = threading.local()
+_lock = threading.Lock()
+_idle = {}          # db_name -> [connection, ...] left by finished threads
+_schema_ready = set()
+
+
+def data_path(*parts):
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+class _ThreadConnections(dict):
+    # Lives in thread-local storage, so it is dropped when its thread ends
+    # (Streamlit runs every rerun on a new thread); the connections then go
+    # back to the idle pool instead of piling up.
+    def __del__(self):
+        with _lock:
+            for db_name, conn in self.items():
+                idle = _idle.setdefault(db_name, [])
+                if conn.in_transaction:
+                    conn.close()  # uncommitted work is rolled back with it
+                elif len(idle) < MAX_IDLE_CONNECTIONS:
+                    idle.append(conn)
+                else:
+                    conn.close()
+
+
+def connect(db_name, schema=()):
+    # One connection per thread per database; SQLite connections must not be
+    # used by two threads at once. `schema` statements run once per database
+    # per process.
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = _ThreadConnections()
+    conn = conns.get(db_name)
+    if conn is None:
+        with _lock:
+            idle = _idle.get(db_name)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            # Handed to another thread only after its owner has finished.
+            conn = sqlite3.connect(data_path(db_name), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conns[db_name] = conn
+    if db_name not in _schema_ready:
+        for statement in schema:
+            conn.execute(statement)
+        with _lock:
+            _schema_ready.add(db_name)
+    return conn
@@ -1,18 +1,12 @@
 import streamlit as st
-import base64
-import os
-
-def get_base64_of_bin_file(filename):
-    file_path = os.path.join(os.getcwd(), "resources", filename)
-    try:
-        with open(file_path, 'rb') as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except FileNotFoundError:
-        return None
+import functools
+import re
+
+from asset_pipeline import background_rules
+
 
 def set_global_style(bg_source):
-    background_css = ""
+    background_rule = ""
 
     if bg_source.startswith("#"):
         background_css = f"""
@@ -27,11 +21,11 @@ def set_global_style(bg_source):
             background-position: center;
         """
     else:
-        b64_data = get_base64_of_bin_file(bg_source)
-        if b64_data:
-            ext = "jpeg" if bg_source.lower().endswith((".jpg", ".jpeg")) else "png"
-            background_css = f"""
-                background-image: url("data:image/{ext};base64,{b64_data}");
+        # Local files go through the asset pipeline: resized WebP/JPEG variants served
+        # from static/ instead of a multi-megabyte base64 data URI on every rerun.
+        background_rule = background_rules(bg_source) or ""
+        if background_rule:
+            background_css = """
                 background-size: cover;
                 background-attachment: fixed;
                 background-position: center;
@@ -39,7 +33,12 @@ def set_global_style(bg_source):
         else:
             background_css = "background-color: #0e1117;"
 
-    st.markdown(f"""
+    st.markdown(_build_style(background_css, background_rule), unsafe_allow_html=True)
+
+
+@functools.lru_cache(maxsize=32)
+def _build_style(background_css, background_rule):
+    return _minify(f"""
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Montserrat:wght@900&display=swap');
 
@@ -68,6 +67,7 @@ def set_global_style(bg_source):
     }}
 
     .stApp {{ {background_css} }}
+    {background_rule}
     
     .logo-text {{
         font-family: 'Montserrat', 'Arial Black', sans-serif !important;
@@ -165,4 +165,9 @@ def set_global_style(bg_source):
         font-weight: bold !important;
     }}
     </style>
-    """, unsafe_allow_html=True)
+    """)
+
+
+def _minify(css):
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{}:;,])\s*", r"\1", css).strip()
@@ -0,0 +1,186 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from asset_pipeline import STATIC_DIR, STATIC_URL
+from metrics import metrics
+import storage
+
+# # Cover thumbnail proxy
+# MAL cover images are fetched once (several at a time), downscaled to WebP and
+# served from static/thumbs/ instead of every browser pulling the full-size
+# original from MAL. The directory is a size-bounded LRU indexed in SQLite.
+# Callers get the local URL when the thumbnail is ready and the original URL
+# otherwise, so a slow or failed fetch never blocks a page.
+
+THUMBS_SUBDIR = "thumbs"
+THUMB_WIDTH = 320
+DETAIL_WIDTH = 480
+WEBP_QUALITY = 75
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = 10
+PAGE_WAIT = 2.0            # how long a results page waits for its covers
+MAX_BYTES = 200 * 1024 * 1024
+TOUCH_INTERVAL = 60        # seconds between last_access updates for the same file
+FAILURE_TTL = 300          # don't retry (or wait on) a failed cover for this long
+ALLOWED_HOSTS = ("cdn.myanimelist.net", "myanimelist.net")
+
+DB_NAME = "thumbnails.sqlite3"
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thumbs (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS thumbs_last_access ON thumbs (last_access)"
+
+_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="thumb-fetch")
+_session = None  # built on the first fetch
+_lock = threading.Lock()
+_inflight = {}   # key -> Future
+_touched = {}    # key -> last time last_access was written
+_failed = {}     # key -> time of the last failed fetch
+_evict_lock = threading.Lock()
+
+
+def _db():
+    return storage.connect(DB_NAME, [_SCHEMA, _INDEX])
+
+
+def _key(url, width):
+    return hashlib.sha1(f"{width}:{url}".encode("utf-8")).hexdigest()
+
+
+def _file_path(key):
+    return os.path.join(STATIC_DIR, THUMBS_SUBDIR, f"{key}.webp")
+
+
+def _local_url(key):
+    # st.image passes through only root-relative static URLs ("/app/static/...").
+    return f"/{STATIC_URL}/{THUMBS_SUBDIR}/{key}.webp"
+
+
+def _proxyable(url):
+    if not url:
+        return False
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and parsed.hostname in ALLOWED_HOSTS
+
+
+def _get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            session = requests.Session()
+            session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_WORKERS))
+            _session = session
+        return _session
+
+
+def _fetch(url, width, key):
+    try:
+        from PIL import Image, ImageOps
+        response = _get_session().get(url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        with Image.open(io.BytesIO(response.content)) as img:
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            if img.width > width:
+                img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+            path = _file_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        conn = _db()
+        conn.execute("INSERT OR REPLACE INTO thumbs VALUES (?, ?, ?, ?)", (key, url, size, time.time()))
+        _evict(conn)
+        return True
+    except Exception:
+        _failed[key] = time.time()
+        return False
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def _evict(conn):
+    with _evict_lock:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM thumbs").fetchone()[0]
+        if total <= MAX_BYTES:
+            return
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM thumbs ORDER BY last_access").fetchall():
+            if total <= MAX_BYTES:
+                break
+            doomed.append(key)
+            total -= size
+        conn.executemany("DELETE FROM thumbs WHERE key = ?", [(key,) for key in doomed])
+        for key in doomed:
+            try:
+                os.remove(_file_path(key))
+            except OSError:
+                pass
+
+
+def _touch(key):
+    now = time.time()
+    if now - _touched.get(key, 0) >= TOUCH_INTERVAL:
+        _touched[key] = now
+        _db().execute("UPDATE thumbs SET last_access = ? WHERE key = ?", (now, key))
+
+
+def _schedule(url, width):
+    # Returns (key, future or None if the thumbnail is already on disk), or
+    # (None, None) while a recent failure says to use the original URL.
+    key = _key(url, width)
+    if os.path.exists(_file_path(key)):
+        return key, None
+    if time.time() - _failed.get(key, 0) < FAILURE_TTL:
+        return None, None
+    with _lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = _inflight[key] = _pool.submit(_fetch, url, width, key)
+    return key, future
+
+
+def thumbnail_urls(urls, width=THUMB_WIDTH, timeout=PAGE_WAIT):
+    # Fetches all missing covers concurrently, waits up to `timeout` for them,
+    # and returns one URL per input (local when ready, original otherwise).
+    scheduled = [(_schedule(url, width) if _proxyable(url) else (None, None)) for url in urls]
+    pending = [future for _, future in scheduled if future is not None]
+    if pending and timeout:
+        wait(pending, timeout=timeout)
+    results = []
+    for url, (key, future) in zip(urls, scheduled):
+        if key is not None:
+            metrics.record_cache("thumbnails", future is None)
+        if key is not None and (future is None or (future.done() and future.result())):
+            _touch(key)
+            results.append(_local_url(key))
+        else:
+            results.append(url)
+    return results
+
+
+def thumbnail_url(url, width=THUMB_WIDTH, timeout=PAGE_WAIT):
+    return thumbnail_urls([url], width=width, timeout=timeout)[0]
+
+
+def prefetch(urls, width=THUMB_WIDTH):
+    # Fire and forget, e.g. covers of the next results page.
+    for url in urls:
+        if _proxyable(url):
+            _schedule(url, width)
+
+
+def cover_url(item):
+    return (item.get('images') or {}).get('jpg', {}).get('image_url') or item.get('image_url')
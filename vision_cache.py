@@ -0,0 +1,80 @@
+import threading
+import time
+
+from image_tools import hamming
+from metrics import metrics
+import storage
+
+# # Perceptual-hash cache of vision results
+# Detections are keyed by the dHash of the prepared image. Re-uploads and
+# near-duplicates (recompressed, resized, slightly cropped screenshots) land
+# within a few bits of each other and are answered without a Gemini call.
+
+DB_NAME = "vision_cache.sqlite3"
+MAX_DISTANCE = 6
+MAX_ENTRIES = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vision_results (
+    phash TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_entries = None  # {phash int: result}, loaded from disk on first use
+
+
+def _db():
+    return storage.connect(DB_NAME, [_SCHEMA])
+
+
+def _load():
+    global _entries
+    if _entries is None:
+        rows = _db().execute(
+            "SELECT phash, result FROM (SELECT * FROM vision_results ORDER BY created_at DESC LIMIT ?)"
+            " ORDER BY created_at", (MAX_ENTRIES,)
+        ).fetchall()
+        _entries = {int(h, 16): result for h, result in rows}
+    return _entries
+
+
+def lookup(phash):
+    with _lock:
+        entries = _load()
+        best = entries.get(phash)
+        if best is None:
+            best_distance = MAX_DISTANCE + 1
+            for known, result in entries.items():
+                distance = hamming(phash, known)
+                if distance < best_distance:
+                    best, best_distance = result, distance
+    metrics.record_cache("vision", best is not None)
+    return best
+
+
+def store(phash, result):
+    with _lock:
+        entries = _load()
+        entries.pop(phash, None)
+        entries[phash] = result  # dict order doubles as age order: oldest first
+        if len(entries) > MAX_ENTRIES:
+            entries.pop(next(iter(entries)))
+        conn = _db()
+        conn.execute(
+            "INSERT OR REPLACE INTO vision_results VALUES (?, ?, ?)", (f"{phash:016x}", result, time.time())
+        )
+        # The table holds what other processes stored too, so trim it as well, not only memory.
+        conn.execute(
+            "DELETE FROM vision_results WHERE phash IN"
+            " (SELECT phash FROM vision_results ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (MAX_ENTRIES,)
+        )
+
+
+def clear():
+    global _entries
+    with _lock:
+        _entries = {}
+        _db().execute("DELETE FROM vision_results")
@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from ai_service import (configure_gemini, generate_profiles, is_profile_cached, profile_batches,
+                        scheduler, PRIORITY_BATCH, PROFILE_BATCH_SIZE)
+from jikan_cache import cached_get
+from jikan_client import JikanError
+import character_index
+
+# # Profile cache warmer
+# Pre-generates AI profiles for MAL's most popular characters so visitors get
+# them from the cache:
+#
+#     python warm_profiles.py --top 100 --rpm 10
+#
+# Characters are sent to Gemini several per request (see generate_profiles),
+# at batch priority, so a warm-up running next to the app only uses quota
+# that interactive users leave over. Already cached characters cost nothing,
+# so an interrupted run simply continues on the next one.
+
+PAGE_LIMIT = 25
+
+
+def top_characters(count):
+    characters = []
+    page = 1
+    while len(characters) < count:
+        data = cached_get("/top/characters", params={"page": page, "limit": PAGE_LIMIT})
+        characters.extend(data.get('data', []))
+        if not (data.get('pagination') or {}).get('has_next_page'):
+            break
+        page += 1
+    return characters[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate AI profiles for the most popular characters.")
+    parser.add_argument("--top", type=int, default=100, help="how many characters (default: 100)")
+    parser.add_argument("--batch-size", type=int, default=PROFILE_BATCH_SIZE,
+                        help=f"characters per Gemini request (default: {PROFILE_BATCH_SIZE})")
+    parser.add_argument("--rpm", type=float, default=10, help="Gemini requests per minute quota (default: 10)")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        parser.error("GEMINI_API_KEY is not set")
+    configure_gemini(api_key)
+    scheduler.configure(args.rpm)
+
+    try:
+        characters = top_characters(args.top)
+    except JikanError as e:
+        print(f"error: could not list top characters: {e}", file=sys.stderr)
+        return 1
+    character_index.upsert_many(characters)
+
+    started = time.monotonic()
+    todo = [c for c in characters if not is_profile_cached(c)]
+    stats = {'characters': len(characters), 'cached': len(characters) - len(todo), 'generated': 0,
+             'batches': profile_batches(len(todo), args.batch_size)}
+    status = 0
+    try:
+        for info, _ in generate_profiles(todo, session="warm", priority=PRIORITY_BATCH, batch_size=args.batch_size):
+            stats['generated'] += 1
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        status = 1
+    stats['elapsed_s'] = round(time.monotonic() - started, 2)
+    print(json.dumps(stats, indent=2), file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())